@@ -0,0 +1,29 @@
+"""
+Centralized settings loaded once from the environment / .env
+"""
+import os
+from functools import lru_cache
+from typing import Optional
+
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+
+class Settings(BaseModel):
+    """Runtime configuration shared by the app and the maintenance scripts"""
+    spreadsheet_id: str = ""
+    google_service_account_file: str = "credentials/service_account.json"
+    google_maps_api_key: Optional[str] = None
+
+
+@lru_cache(maxsize=None)
+def get_settings() -> Settings:
+    """Parse .env and the environment once per process"""
+    load_dotenv()
+    return Settings(
+        spreadsheet_id=os.getenv("SPREADSHEET_ID", ""),
+        google_service_account_file=os.getenv(
+            "GOOGLE_SERVICE_ACCOUNT_FILE", "credentials/service_account.json"
+        ),
+        google_maps_api_key=os.getenv("GOOGLE_MAPS_API_KEY"),
+    )
@@ -2,17 +2,28 @@
 Google Distance Matrix API integration for travel time calculations
 """
 import os
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 import googlemaps
-from typing import List, Tuple, Dict, Any
+import requests
+from typing import List, Tuple, Dict, Any, Optional
 import math
+import numpy as np
+
+from app.integrations.http_session import create_pooled_session
 
 
 class DistanceMatrixClient:
     """Client for Google Distance Matrix API"""
     
-    def __init__(self, api_key: str):
+    # Max batch requests in flight at once (well under the API's QPS limit)
+    MAX_CONCURRENT_REQUESTS = 8
+    
+    def __init__(self, api_key: str, session: Optional[requests.Session] = None):
         self.api_key = api_key
-        self.client = googlemaps.Client(key=api_key)
+        self.session = session or create_pooled_session()
+        self.client = googlemaps.Client(key=api_key, requests_session=self.session)
     
     def get_distance_matrix(
         self, 
@@ -87,26 +98,53 @@ class DistanceMatrixClient:
         if n <= 10:
             return self.get_distance_matrix(locations, locations, mode)
         
+        return self.get_matrix(locations, locations, mode)
+    
+    def get_matrix(
+        self,
+        origins: List[Tuple[float, float]],
+        destinations: List[Tuple[float, float]],
+        mode: str = "driving"
+    ) -> Dict[str, Any]:
+        """
+        Get a (possibly rectangular) distance/duration matrix of any size.
+        Handles API limits by batching requests.
+        """
+        n_origins = len(origins)
+        n_destinations = len(destinations)
+        
         # For larger matrices, we need to batch
-        # This is a simplified version - production should handle this better
+        # (10x10 = 100 elements, the per-request limit)
         batch_size = 10
-        distances = [[0] * n for _ in range(n)]
-        durations = [[0] * n for _ in range(n)]
-        
-        for i_start in range(0, n, batch_size):
-            i_end = min(i_start + batch_size, n)
-            for j_start in range(0, n, batch_size):
-                j_end = min(j_start + batch_size, n)
-                
-                origins = locations[i_start:i_end]
-                destinations = locations[j_start:j_end]
-                
-                result = self.get_distance_matrix(origins, destinations, mode)
-                
-                for i_local, i_global in enumerate(range(i_start, i_end)):
-                    for j_local, j_global in enumerate(range(j_start, j_end)):
-                        distances[i_global][j_global] = result["distances"][i_local][j_local]
-                        durations[i_global][j_global] = result["durations"][i_local][j_local]
+        distances = [[0] * n_destinations for _ in range(n_origins)]
+        durations = [[0] * n_destinations for _ in range(n_origins)]
+        
+        blocks = [
+            (i_start, j_start)
+            for i_start in range(0, n_origins, batch_size)
+            for j_start in range(0, n_destinations, batch_size)
+        ]
+        if not blocks:
+            return {"distances": distances, "durations": durations}
+        
+        def fetch_block(block):
+            i_start, j_start = block
+            return self.get_distance_matrix(
+                origins[i_start:i_start + batch_size],
+                destinations[j_start:j_start + batch_size],
+                mode
+            )
+        
+        # Batches are independent, so request them concurrently
+        workers = min(self.MAX_CONCURRENT_REQUESTS, len(blocks))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(fetch_block, blocks))
+        
+        for (i_start, j_start), result in zip(blocks, results):
+            j_end = min(j_start + batch_size, n_destinations)
+            for i_local, i_global in enumerate(range(i_start, min(i_start + batch_size, n_origins))):
+                distances[i_global][j_start:j_end] = result["distances"][i_local]
+                durations[i_global][j_start:j_end] = result["durations"][i_local]
         
         return {
             "distances": distances,
@@ -130,23 +168,116 @@ class DistanceMatrixClient:
         return R * c
 
 
+class DistanceMatrixCache:
+    """
+    Remembers API distances and durations between locations requested together, so
+    re-optimizing a route only requests the legs that involve new locations.
+    """
+    
+    def __init__(self, client: DistanceMatrixClient, max_locations: int = 500):
+        self.client = client
+        self.max_locations = max_locations
+        self._known: set = set()
+        # (origin, destination) -> (meters, seconds); only legs between co-requested stops
+        self._legs: Dict[Tuple[Tuple[float, float], Tuple[float, float]], Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+    
+    def get_distances(self, locations: List[Tuple[float, float]]) -> List[List[int]]:
+        """Square distance matrix (meters) for locations, fetching only missing legs"""
+        return self.get_matrices(locations)[0]
+    
+    def get_matrices(self, locations: List[Tuple[float, float]]) -> Tuple[List[List[int]], List[List[int]]]:
+        """Square distance (meters) and duration (seconds) matrices, fetching only missing legs"""
+        keys = [(float(lat), float(lng)) for lat, lng in locations]
+        unique = list(dict.fromkeys(keys))
+        
+        with self._lock:
+            new = [k for k in unique if k not in self._known]
+            if len(self._known) + len(new) > self.max_locations:
+                # Start over rather than grow without bound
+                self._known = set()
+                self._legs = {}
+                new = unique
+            legs = {}
+            missing = []
+            for o in unique:
+                for d in unique:
+                    if o == d:
+                        continue
+                    value = self._legs.get((o, d))
+                    if value is None:
+                        missing.append((o, d))
+                    else:
+                        legs[(o, d)] = value
+        
+        # Network I/O happens outside the lock so other optimizations aren't blocked
+        if missing:
+            fetched = self._fetch(unique, new, missing)
+            legs.update(fetched)
+            with self._lock:
+                self._legs.update(fetched)
+                self._known.update(unique)
+        
+        distances = [[0 if o == d else legs[(o, d)][0] for d in keys] for o in keys]
+        durations = [[0 if o == d else legs[(o, d)][1] for d in keys] for o in keys]
+        return distances, durations
+    
+    def _fetch(self, unique, new, missing) -> Dict[Tuple[Tuple[float, float], Tuple[float, float]], Tuple[int, int]]:
+        """Fetch new x requested and requested-known x new, then any other missing legs"""
+        fetched = {}
+        
+        def store(origins, destinations):
+            result = self.client.get_matrix(origins, destinations)
+            for o, dist_row, dur_row in zip(origins, result["distances"], result["durations"]):
+                for d, meters, seconds in zip(destinations, dist_row, dur_row):
+                    fetched[(o, d)] = (int(meters), int(seconds))
+        
+        if new:
+            new_set = set(new)
+            store(new, unique)
+            known = [k for k in unique if k not in new_set]
+            if known:
+                store(known, new)
+        
+        # Known stops that were never requested together
+        leftover = [pair for pair in missing if pair not in fetched]
+        if leftover:
+            store(
+                list(dict.fromkeys(o for o, _ in leftover)),
+                list(dict.fromkeys(d for _, d in leftover))
+            )
+        return fetched
+
+
 def calculate_haversine_matrix(locations: List[Tuple[float, float]]) -> List[List[float]]:
     """
     Calculate full distance matrix using haversine formula.
     Useful when API calls need to be minimized or for testing.
     
     Returns distances in meters.
+    Results are memoized on coordinates rounded to 5 decimals (~1 m),
+    so repeated optimizations over the same stops skip the trig work.
     """
-    n = len(locations)
-    matrix = [[0] * n for _ in range(n)]
+    if len(locations) == 0:
+        return []
+    
+    key = tuple((round(float(lat), 5), round(float(lng), 5)) for lat, lng in locations)
+    # Copy rows out of the cached tuples so callers can't mutate the cache
+    return [list(row) for row in _haversine_matrix(key)]
+
+
+@lru_cache(maxsize=64)
+def _haversine_matrix(locations: Tuple[Tuple[float, float], ...]) -> Tuple[Tuple[int, ...], ...]:
+    """Vectorized haversine over all pairs, computed in float32."""
+    R = np.float32(6371000)  # Earth's radius in meters
+    
+    coords = np.radians(np.asarray(locations, dtype=np.float32))
+    lat = coords[:, 0:1]  # column vector (n, 1)
+    lng = coords[:, 1:2]
     
-    for i in range(n):
-        for j in range(n):
-            if i != j:
-                dist = DistanceMatrixClient._haversine_distance(
-                    locations[i][0], locations[i][1],
-                    locations[j][0], locations[j][1]
-                )
-                matrix[i][j] = int(dist * 1000)  # Convert to meters
+    a = (np.sin((lat.T - lat) / 2)**2 +
+         np.cos(lat) * np.cos(lat.T) * np.sin((lng.T - lng) / 2)**2)
+    a = np.clip(a, 0.0, 1.0)  # guard against rounding just outside [0, 1]
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
     
-    return matrix
+    return tuple(map(tuple, (R * c).astype(np.int64).tolist()))
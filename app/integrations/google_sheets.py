@@ -2,12 +2,33 @@
 Google Sheets integration for reading/writing logistics data
 """
 import os
+import math
 import gspread
+from gspread.http_client import HTTPClient
 from google.oauth2.service_account import Credentials
-from typing import List, Dict, Any, Optional
+from google.auth.transport.requests import AuthorizedSession, Request
+from typing import List, Dict, Any, Optional, Iterator, Tuple
 from datetime import datetime
+import json
 import uuid
+import threading
+from functools import partial
 import traceback
+from cachetools import TTLCache
+
+from app.integrations.http_session import TokenBucket, mount_pooled_adapter
+
+# Order statuses (lowercased) that go into route optimization.
+# Often new orders start as "Pendiente" until reviewed; "En Ruta" allowed for re-optimization.
+OPTIMIZABLE_STATUSES = frozenset({"confirmado", "pendiente", "preventa", "en ruta"})
+
+
+class PooledHTTPClient(HTTPClient):
+    """gspread HTTP client that sends through our pooled, rate-limited session"""
+    
+    def __init__(self, auth: Credentials, session=None, *, pooled_session) -> None:
+        # gspread 6.0 calls http_client(auth), later versions http_client(auth, session)
+        super().__init__(auth, session=pooled_session)
 
 
 class GoogleSheetsClient:
@@ -18,11 +39,25 @@ class GoogleSheetsClient:
         'https://www.googleapis.com/auth/drive'
     ]
     
+    # Process-wide Sheets request budgets (read and write quotas are separate, 60/min per user each),
+    # shared by every client instance so bursts are smoothed here instead of turning into 429 + backoff sleeps
+    READ_LIMITER = TokenBucket(rate=60, period=60)
+    WRITE_LIMITER = TokenBucket(rate=60, period=60)
+    
+    # Access token persisted between runs so CLI scripts skip the JWT exchange
+    TOKEN_CACHE_PATH = os.path.expanduser(
+        os.getenv("SHEETS_TOKEN_CACHE", "~/.cache/hidalguense/token.json")
+    )
+    
     def __init__(self, credentials_path: str, spreadsheet_id: str):
         self.credentials_path = credentials_path
         self.spreadsheet_id = spreadsheet_id
         self._client: Optional[gspread.Client] = None
         self._spreadsheet: Optional[gspread.Spreadsheet] = None
+        # (spreadsheet_id, fecha_ruta) -> (orders, prospects); cleared on writes to the source sheets
+        self._optimize_inputs_cache = TTLCache(maxsize=32, ttl=30)
+        # TTLCache isn't thread-safe and is touched from several to_thread workers
+        self._optimize_inputs_lock = threading.Lock()
     
     def connect(self) -> None:
         """Initialize connection to Google Sheets"""
@@ -30,10 +65,56 @@ class GoogleSheetsClient:
             self.credentials_path, 
             scopes=self.SCOPES
         )
-        self._client = gspread.authorize(creds)
+        # Keep-alive pool so concurrent reads reuse TLS connections
+        session = mount_pooled_adapter(
+            AuthorizedSession(creds),
+            read_limiter=self.READ_LIMITER,
+            write_limiter=self.WRITE_LIMITER
+        )
+        self._load_cached_token(creds)
+        if not creds.valid:
+            creds.refresh(Request())
+            self._save_cached_token(creds)
+        self._client = gspread.authorize(
+            creds, http_client=partial(PooledHTTPClient, pooled_session=session)
+        )
         self._spreadsheet = self._client.open_by_key(self.spreadsheet_id)
         self._initialize_schema()
     
+    def _load_cached_token(self, creds: Credentials) -> None:
+        """Reuse a still-valid access token for the same service account, if cached"""
+        try:
+            with open(self.TOKEN_CACHE_PATH) as f:
+                cached = json.load(f)
+            if cached.get("account") != creds.service_account_email or cached.get("scopes") != self.SCOPES:
+                return
+            creds.token = cached["token"]
+            creds.expiry = datetime.fromisoformat(cached["expiry"])
+        except (OSError, ValueError, KeyError):
+            pass
+    
+    def _save_cached_token(self, creds: Credentials) -> None:
+        """Persist the access token (owner-only file) for the next run"""
+        try:
+            os.makedirs(os.path.dirname(self.TOKEN_CACHE_PATH), exist_ok=True)
+            tmp_path = f"{self.TOKEN_CACHE_PATH}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump({
+                    "account": creds.service_account_email,
+                    "scopes": self.SCOPES,
+                    "token": creds.token,
+                    "expiry": creds.expiry.isoformat()
+                }, f)
+            os.replace(tmp_path, self.TOKEN_CACHE_PATH)
+        except OSError as e:
+            print(f"⚠ Could not cache Sheets token: {e}")
+    
+    def _invalidate_optimize_inputs(self) -> None:
+        """Drop cached optimize inputs after a write to PEDIDOS/CLIENTES/PROSPECTOS"""
+        with self._optimize_inputs_lock:
+            self._optimize_inputs_cache.clear()
+    
     def ensure_connected(self) -> None:
         """Ensure we have an active connection"""
         if not self._spreadsheet:
@@ -104,7 +185,11 @@ class GoogleSheetsClient:
         by ignoring empty header columns and keeping the last value for duplicates.
         Returns values as strings (gspread default for get_all_values).
         """
-        rows = worksheet.get_all_values()
+        return self._records_from_values(worksheet.get_all_values())
+
+    @staticmethod
+    def _records_from_values(rows: List[List[Any]]) -> List[Dict[str, Any]]:
+        """Turn a raw values grid (header row first) into records, as _get_all_records_safe"""
         if not rows:
             return []
         
@@ -118,6 +203,11 @@ class GoogleSheetsClient:
             # If row is longer, zip stops at headers.
             # We treat strict pairing.
             
+            # values.batchGet trims trailing empty cells (and returns blank rows as []),
+            # so pad to the header width like get_all_values does
+            if len(row) < len(headers):
+                row = row + [""] * (len(headers) - len(row))
+            
             for h, v in zip(headers, row):
                 if h and str(h).strip(): # Only include if header is non-empty
                     record[h] = v
@@ -126,6 +216,15 @@ class GoogleSheetsClient:
             
         return records
 
+    def _batch_get_records(self, *sheet_names: str) -> List[List[Dict[str, Any]]]:
+        """Read several whole worksheets in a single values.batchGet request"""
+        self.ensure_connected()
+        response = self._spreadsheet.values_batch_get(list(sheet_names))
+        return [
+            self._records_from_values(value_range.get("values", []))
+            for value_range in response.get("valueRanges", [])
+        ]
+
     # ============ CLIENTES ============
     
     def get_all_clients(self) -> List[Dict[str, Any]]:
@@ -146,6 +245,7 @@ class GoogleSheetsClient:
     def create_client(self, client_data: Dict[str, Any]) -> str:
         """Create a new client and return the ID"""
         self.ensure_connected()
+        self._invalidate_optimize_inputs()
         worksheet = self._spreadsheet.worksheet("CLIENTES")
         
         # Generate ID
@@ -173,6 +273,7 @@ class GoogleSheetsClient:
     def update_client(self, client_id: str, updates: Dict[str, Any]) -> bool:
         """Update an existing client's info"""
         self.ensure_connected()
+        self._invalidate_optimize_inputs()
         worksheet = self._spreadsheet.worksheet("CLIENTES")
         
         cell = worksheet.find(client_id)
@@ -206,6 +307,7 @@ class GoogleSheetsClient:
     def delete_client(self, client_id: str) -> bool:
         """Delete a client row from CLIENTES sheet"""
         self.ensure_connected()
+        self._invalidate_optimize_inputs()
         worksheet = self._spreadsheet.worksheet("CLIENTES")
         
         cell = worksheet.find(client_id)
@@ -225,7 +327,33 @@ class GoogleSheetsClient:
             records = [r for r in records if r.get("ID_Cliente") == client_id]
         
         return records
-    
+
+    def iter_special_prices(self, client_id: str) -> Iterator[Tuple[str, float]]:
+        """Yield (producto, precio) for a client's numeric price rules without building row dicts"""
+        self.ensure_connected()
+        rows = self._spreadsheet.values_get("PRECIOS_ESPECIALES").get("values", [])
+        if not rows:
+            return
+
+        headers = rows[0]
+        try:
+            client_i = headers.index("ID_Cliente")
+            prod_i = headers.index("Producto")
+            price_i = headers.index("Precio_Pactado")
+        except ValueError:
+            return
+        width = max(client_i, prod_i, price_i) + 1
+
+        for row in rows[1:]:
+            if len(row) < width or row[client_i] != client_id or not row[prod_i]:
+                continue
+            try:
+                price = float(row[price_i])
+            except (TypeError, ValueError):
+                continue
+            if math.isfinite(price):
+                yield row[prod_i], price
+
     def get_price_for_client_product(self, client_id: str, product: str, base_price: float) -> float:
         """Get the price for a client+product combination, or return base price"""
         prices = self.get_special_prices(client_id)
@@ -251,6 +379,7 @@ class GoogleSheetsClient:
     def create_prospect(self, data: Dict[str, Any]) -> str:
         """Create a new prospect"""
         self.ensure_connected()
+        self._invalidate_optimize_inputs()
         worksheet = self._spreadsheet.worksheet("PROSPECTOS")
         
         prospect_id = f"PROS-{uuid.uuid4().hex[:8].upper()}"
@@ -279,7 +408,11 @@ class GoogleSheetsClient:
         self.ensure_connected()
         worksheet = self._spreadsheet.worksheet("PROSPECTOS")
         records = self._get_all_records_safe(worksheet)
-        
+        return self._filter_pending_prospects(records, target_date)
+
+    @staticmethod
+    def _filter_pending_prospects(records: List[Dict[str, Any]], target_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Pending prospects from PROSPECTOS records, as get_pending_prospects"""
         pending = [r for r in records if r.get("Estatus") == "Pendiente"]
         
         if target_date:
@@ -308,6 +441,7 @@ class GoogleSheetsClient:
     def delete_prospect(self, prospect_id: str) -> bool:
         """Delete a prospect row by ID"""
         self.ensure_connected()
+        self._invalidate_optimize_inputs()
         worksheet = self._spreadsheet.worksheet("PROSPECTOS")
         try:
             cell = worksheet.find(prospect_id)
@@ -320,6 +454,7 @@ class GoogleSheetsClient:
     def mark_prospect_visited(self, prospect_id: str) -> bool:
         """Mark a prospect as visited/converted"""
         self.ensure_connected()
+        self._invalidate_optimize_inputs()
         worksheet = self._spreadsheet.worksheet("PROSPECTOS")
         
         cell = worksheet.find(prospect_id)
@@ -347,6 +482,20 @@ class GoogleSheetsClient:
         
         return filtered
     
+    def get_order_with_client(self, order_id: str) -> Optional[tuple]:
+        """
+        Get an order and its client in one round trip (PEDIDOS + CLIENTES batchGet).
+        Returns (order, client_or_None), or None if the order doesn't exist.
+        """
+        orders, clients = self._batch_get_records("PEDIDOS", "CLIENTES")
+        
+        order = next((o for o in orders if o.get("ID_Pedido") == order_id), None)
+        if not order:
+            return None
+        
+        client = next((c for c in clients if c.get("ID_Cliente") == order.get("ID_Cliente")), None)
+        return order, client
+    
     def get_orders_for_optimization(self, fecha_ruta: str) -> List[Dict[str, Any]]:
         """Get orders ready for route optimization (Confirmado OR Pendiente status)"""
         # Fetch all orders for the date first
@@ -354,7 +503,35 @@ class GoogleSheetsClient:
         self.ensure_connected()
         worksheet = self._spreadsheet.worksheet("PEDIDOS")
         records = self._get_all_records_safe(worksheet)
-        
+        return self._orders_for_optimization(records, self.get_all_clients(), fecha_ruta)
+
+    def batch_get_optimize_inputs(self, fecha_ruta: str) -> tuple:
+        """
+        Orders and pending prospects for route optimization in one values.batchGet
+        (PEDIDOS + CLIENTES + PROSPECTOS). Returns (orders, prospects), cached for 30s.
+        """
+        key = (self.spreadsheet_id, fecha_ruta)
+        with self._optimize_inputs_lock:
+            cached = self._optimize_inputs_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        orders, clients, prospects = self._batch_get_records("PEDIDOS", "CLIENTES", "PROSPECTOS")
+        result = (
+            self._orders_for_optimization(orders, clients, fecha_ruta),
+            self._filter_pending_prospects(prospects)
+        )
+        with self._optimize_inputs_lock:
+            self._optimize_inputs_cache[key] = result
+        return result
+
+    @staticmethod
+    def _orders_for_optimization(
+        records: List[Dict[str, Any]],
+        client_records: List[Dict[str, Any]],
+        fecha_ruta: str
+    ) -> List[Dict[str, Any]]:
+        """Active orders for the date enriched with client location, as get_orders_for_optimization"""
         # Debug Date Matching
         matching_date_count = 0
         for r in records:
@@ -368,22 +545,19 @@ class GoogleSheetsClient:
         all_orders = [r for r in records if str(r.get("Fecha_Ruta")).strip() == fecha_ruta.strip()]
         
         # Filter for active statuses (case insensitive just in case)
-        # Often new orders start as "Pendiente" until reviewed.
-        # "En Ruta" allowed for re-optimization.
-        valid_statuses = ["confirmado", "pendiente", "preventa", "en ruta"]
         orders = []
         
         for o in all_orders:
             status = str(o.get("Estatus", "")).strip().lower()
-            if status in valid_statuses:
+            if status in OPTIMIZABLE_STATUSES:
                 orders.append(o)
             else:
-                print(f"DEBUG: Skipping order {o.get('ID_Pedido')} - Status '{status}' not in {valid_statuses}")
+                print(f"DEBUG: Skipping order {o.get('ID_Pedido')} - Status '{status}' not in {sorted(OPTIMIZABLE_STATUSES)}")
         
         print(f"DEBUG: get_orders_for_optimization returns {len(orders)} active orders.")
         
         # Enrich with client data
-        clients = {c["ID_Cliente"]: c for c in self.get_all_clients()}
+        clients = {c["ID_Cliente"]: c for c in client_records if c.get("ID_Cliente")}
         
         for order in orders:
             client = clients.get(order.get("ID_Cliente"))
@@ -401,6 +575,7 @@ class GoogleSheetsClient:
     def create_order(self, order_data: Dict[str, Any]) -> str:
         """Create a new order"""
         self.ensure_connected()
+        self._invalidate_optimize_inputs()
         worksheet = self._spreadsheet.worksheet("PEDIDOS")
         
         order_id = f"PED-{uuid.uuid4().hex[:8].upper()}"
@@ -452,6 +627,7 @@ class GoogleSheetsClient:
     def update_order_status(self, order_id: str, status: str) -> bool:
         """Update the status of an order"""
         self.ensure_connected()
+        self._invalidate_optimize_inputs()
         worksheet = self._spreadsheet.worksheet("PEDIDOS")
         
         cell = worksheet.find(order_id)
@@ -465,6 +641,7 @@ class GoogleSheetsClient:
     def delete_order(self, order_id: str) -> bool:
         """Delete an order row from PEDIDOS sheet and decrement Client Counter"""
         self.ensure_connected()
+        self._invalidate_optimize_inputs()
         worksheet = self._spreadsheet.worksheet("PEDIDOS")
         
         try:
@@ -506,6 +683,7 @@ class GoogleSheetsClient:
         """Mark an order as delivered with actual kg using batch update"""
         try:
             self.ensure_connected()
+            self._invalidate_optimize_inputs()
             worksheet = self._spreadsheet.worksheet("PEDIDOS")
             
             # DEBUG TRACING FOR 500 ERROR
@@ -649,6 +827,8 @@ class GoogleSheetsClient:
             except Exception as e:
                 print(f"Error updating {update['order_id']}: {e}")
         
+        # Estatus and Orden_Visita changed, so cached optimize inputs are stale
+        self._invalidate_optimize_inputs()
         return success_count
 
     # ============ WEEKLY SUMMARY ============
@@ -0,0 +1,105 @@
+"""
+Shared HTTP session setup (connection pooling + keep-alive) for Google APIs
+"""
+import asyncio
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class TokenBucket:
+    """Thread-safe limiter: bursts up to `rate` calls, refilled at rate/period per second"""
+    
+    def __init__(self, rate: int, period: float):
+        self.capacity = rate
+        self.fill_rate = rate / period
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def try_acquire(self) -> float:
+        """Take a token if one is available; otherwise return seconds until the next one"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.fill_rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.fill_rate
+    
+    def acquire(self) -> None:
+        """Block until a call is allowed"""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class RateLimitExceeded(requests.exceptions.RequestException):
+    """Request budget spent on the event-loop thread, where waiting would stall every request"""
+    
+    def __init__(self, retry_after: float, **kwargs):
+        self.retry_after = retry_after
+        super().__init__(f"Rate limit reached, retry in {retry_after:.1f}s", **kwargs)
+
+
+def _on_event_loop() -> bool:
+    """True when called from a thread that is running an asyncio event loop"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that takes a token from shared TokenBuckets before each request,
+    reads and writes from separate buckets (they are separate quotas).
+    Worker threads wait for a token; the event-loop thread gets RateLimitExceeded instead.
+    """
+    
+    def __init__(self, read_limiter: TokenBucket, write_limiter: Optional[TokenBucket] = None, **kwargs):
+        self.read_limiter = read_limiter
+        self.write_limiter = write_limiter or read_limiter
+        super().__init__(**kwargs)
+    
+    def send(self, request, **kwargs):
+        limiter = self.read_limiter if request.method in ("GET", "HEAD") else self.write_limiter
+        if _on_event_loop():
+            wait = limiter.try_acquire()
+            if wait:
+                raise RateLimitExceeded(wait, request=request)
+        else:
+            limiter.acquire()
+        return super().send(request, **kwargs)
+
+
+def mount_pooled_adapter(
+    session: requests.Session,
+    read_limiter: Optional[TokenBucket] = None,
+    write_limiter: Optional[TokenBucket] = None
+) -> requests.Session:
+    """Mount a keep-alive connection pool with light retries on an existing session"""
+    pool_options = dict(
+        pool_connections=20,
+        pool_maxsize=100,
+        max_retries=Retry(total=3, backoff_factor=0.3)
+    )
+    if read_limiter:
+        adapter = RateLimitedAdapter(read_limiter, write_limiter, **pool_options)
+    else:
+        adapter = HTTPAdapter(**pool_options)
+    session.mount("https://", adapter)
+    return session
+
+
+def create_pooled_session() -> requests.Session:
+    """New requests.Session whose sockets are reused across calls"""
+    return mount_pooled_adapter(requests.Session())
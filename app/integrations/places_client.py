@@ -2,13 +2,17 @@
 Google Places API integration for Lead Generation (Prospecting)
 """
 import googlemaps
+import requests
 from typing import List, Dict, Any, Optional
 
+from app.integrations.http_session import create_pooled_session
+
 class PlacesClient:
     """Client for Google Places & Geocoding APIs"""
     
-    def __init__(self, api_key: str):
-        self.client = googlemaps.Client(key=api_key)
+    def __init__(self, api_key: str, session: Optional[requests.Session] = None):
+        self.session = session or create_pooled_session()
+        self.client = googlemaps.Client(key=api_key, requests_session=self.session)
         
     def geocode_region(self, region_query: str) -> Optional[Dict[str, float]]:
         """
@@ -36,8 +40,6 @@ class PlacesClient:
         Search for places nearby a location using Places API (New).
         Docs: https://developers.google.com/maps/documentation/places/web-service/text-search
         """
-        import requests
-        
         try:
             print(f"DEBUG: Searching Places (New API). Lat: {lat}, Lng: {lng}, Radius: {radius}, Keyword: {keyword}")
             
@@ -64,7 +66,7 @@ class PlacesClient:
                 "maxResultCount": 20
             }
             
-            response = requests.post(url, json=payload, headers=headers)
+            response = self.session.post(url, json=payload, headers=headers)
             
             if response.status_code != 200:
                 error_msg = f"Places API Error {response.status_code}: {response.text}"
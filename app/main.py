@@ -6,6 +6,7 @@ Optimización VRP con constraint de seguridad (Huichapan)
 Integración con Google Sheets para AppSheet
 """
 import os
+import threading
 from datetime import datetime
 from typing import List, Optional
 from contextlib import asynccontextmanager
@@ -13,8 +14,10 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse
 from dotenv import load_dotenv
+from cachetools import TTLCache, cached
+from cachetools.keys import hashkey
 
 from app.models.schemas import (
     Client, Order, SpecialPrice,
@@ -93,6 +96,7 @@ app = FastAPI(
     title="Sistema Última Milla",
     description="API de optimización de rutas para distribuidora de lácteos",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -193,7 +197,7 @@ async def create_client(request: CreateClientRequest):
         }
     
     try:
-        print(f"DEBUG: Received Client Payload: {request.dict()}")
+        print(f"DEBUG: Received Client Payload: {request.model_dump()}")
         # Create Client
         client_id = sheets_client.create_client({
             "nombre_negocio": request.nombre_negocio,
@@ -620,11 +624,14 @@ async def visit_prospect(prospect_id: str):
 # ============ ROUTE OPTIMIZATION ============
 
 @app.post("/api/optimize-route")
-async def optimize_route(request: OptimizeRouteRequest):
+def optimize_route(request: OptimizeRouteRequest):
     """
     Optimize delivery route for a given date.
     
     HARD CONSTRAINT: Route must pass through Huichapan first (security).
+    
+    Declared with plain def: OR-Tools and gspread block, so FastAPI runs it
+    in its threadpool instead of stalling the event loop.
     """
     print(f"DEBUG: Processing Optimize Request for {request.fecha_ruta}")
     # Use demo data if not connected or in test mode
@@ -791,12 +798,14 @@ async def optimize_route(request: OptimizeRouteRequest):
 
     
     print(f"DEBUG: Distance Matrix Locations count: {len(locations)}")
-    # Get distance matrix
+    # Get distance matrix (and real travel times when the API answered)
+    time_matrix = None
     if distance_client and not use_demo:
         try:
             print("DEBUG: Requesting Distance Matrix from API...")
             matrix_result = distance_client.get_full_matrix(locations)
             distance_matrix = matrix_result["distances"]
+            time_matrix = matrix_result["durations"]
             print(f"DEBUG: Distance Matrix API success. Size: {len(distance_matrix)}x{len(distance_matrix[0]) if distance_matrix else 0}")
         except Exception as e:
             print(f"DEBUG: Distance Matrix API error, falling back to Haversine: {e}")
@@ -821,7 +830,7 @@ async def optimize_route(request: OptimizeRouteRequest):
     if distance_matrix:
         print(f"DEBUG: Matrix Row Count: {len(distance_matrix)}")
 
-    result = solver.solve(delivery_nodes, distance_matrix)
+    result = solver.solve(delivery_nodes, distance_matrix, time_matrix)
     print(f"DEBUG: Solver FINAL Result: Success={result.success}, Message={result.message}, Orders={len(result.ordered_nodes)}")
     
     if not result.success:
@@ -843,6 +852,11 @@ async def optimize_route(request: OptimizeRouteRequest):
             continue
             
         real_items = solver_nodes_map.get(node.id)
+        if real_items and len(real_items) == 1 and real_items[0]["id"] == node.id:
+            # Single (non-proxy) node: the solver node already is the original item
+            ordered_nodes_expanded.append(node)
+            continue
+
         if real_items:
             for item in real_items:
                 ordered_nodes_expanded.append(DeliveryNode(
@@ -1051,25 +1065,26 @@ class CreateSpecialPriceRequest(BaseModel):
     producto: str
     precio_pactado: float
 
+# Parsed price maps per client, busted when a new rule is written
+_special_prices_cache = TTLCache(maxsize=1024, ttl=120)
+# The handlers are sync and run in the threadpool; TTLCache itself isn't thread-safe
+_special_prices_lock = threading.Lock()
+
+
+@cached(cache=_special_prices_cache, lock=_special_prices_lock)
+def _get_special_price_map(client_id: str) -> dict:
+    """Fetch special prices as {"Queso Oaxaca": 140.0, ...}"""
+    return dict(sheets_client.iter_special_prices(client_id))
+
+
 @app.get("/api/clients/{client_id}/prices")
-async def get_client_special_prices(client_id: str):
+def get_client_special_prices(client_id: str):
     """Get all special prices for this client"""
     if not sheets_client:
         return {"prices": {}, "demo_mode": True}
     
     try:
-        prices = sheets_client.get_special_prices(client_id)
-        # Simplify list: {"Queso Oaxaca": 140.0, ...}
-        price_map = {}
-        for p in prices:
-            prod = p.get("Producto")
-            try:
-                val = float(p.get("Precio_Pactado", 0))
-                if prod:
-                    price_map[prod] = val
-            except:
-                pass
-                
+        price_map = _get_special_price_map(client_id)
         return {"prices": price_map}
     except HTTPException:
         raise
@@ -1079,7 +1094,7 @@ async def get_client_special_prices(client_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/special-prices")
-async def create_special_price_endpoint(request: CreateSpecialPriceRequest):
+def create_special_price_endpoint(request: CreateSpecialPriceRequest):
     """Create a new special price rule"""
     if not sheets_client:
         return {"success": True, "message": "Demo Mode: Price Created"}
@@ -1090,6 +1105,8 @@ async def create_special_price_endpoint(request: CreateSpecialPriceRequest):
             request.producto,
             request.precio_pactado
         )
+        with _special_prices_lock:
+            _special_prices_cache.pop(hashkey(request.id_cliente), None)
         return {
             "success": True,
             "rule_id": rule_id,
@@ -4,17 +4,32 @@ Backend API con FastAPI
 
 Optimización VRP con constraint de seguridad (Huichapan)
 Integración con Google Sheets para AppSheet
+
+Ejecución (uvloop + httptools vienen incluidos en uvicorn[standard]):
+    uvicorn app.main_fixed:app --host 0.0.0.0 --port 8000 --loop uvloop --http httptools
+
+Las cachés y los trabajos de optimización viven en memoria del proceso;
+con --workers > 1 el polling de /api/optimize-route/jobs debe llegar al mismo worker.
 """
 import os
+import re
+import asyncio
+import hashlib
+import uuid
 from datetime import datetime
+from collections import defaultdict
 from typing import List, Optional
 from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse
 from dotenv import load_dotenv
+from cachetools import TTLCache
+import numpy as np
 
 from app.models.schemas import (
     Client, Order, SpecialPrice,
@@ -25,11 +40,12 @@ from app.models.schemas import (
 from pydantic import BaseModel
 
 from app.integrations.google_sheets import GoogleSheetsClient
-from app.integrations.distance_matrix import DistanceMatrixClient, calculate_haversine_matrix
+from app.integrations.distance_matrix import DistanceMatrixClient, DistanceMatrixCache, calculate_haversine_matrix
 from app.integrations.pdf_generator import generate_receipt_pdf, generate_whatsapp_link
 from app.optimization.vrp_solver import VRPSolver, DeliveryNode, build_distance_matrix_for_solver
 from app.integrations.places_client import PlacesClient # NEW
-import difflib # For fuzzy matching
+from app.integrations.http_session import create_pooled_session
+from rapidfuzz import fuzz, process # For fuzzy matching
 
 # Load environment variables
 load_dotenv()
@@ -48,17 +64,74 @@ WAREHOUSE_LAT = float(os.getenv("WAREHOUSE_LAT", "19.4326"))
 WAREHOUSE_LNG = float(os.getenv("WAREHOUSE_LNG", "-99.1332"))
 WAREHOUSE_NAME = os.getenv("WAREHOUSE_NAME", "Almacén Principal")
 
+# First rows of every distance matrix: [Depot, Security waypoint]
+FIXED_LOCATIONS = np.array([
+    [WAREHOUSE_LAT, WAREHOUSE_LNG],
+    [HUICHAPAN_LAT, HUICHAPAN_LNG],
+], dtype=np.float64)
+FIXED_LOCATIONS.flags.writeable = False
+
+# Above this many stops the route is split into sectors and solved piecewise
+CLUSTER_THRESHOLD = 80
+
 # Global clients
 sheets_client: Optional[GoogleSheetsClient] = None
 distance_client: Optional[DistanceMatrixClient] = None
 places_client: Optional[PlacesClient] = None # NEW
 
 
+async def _run(fn, *args, **kwargs):
+    """Run a blocking gspread/Google Maps call in a worker thread"""
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+# CLIENTES sheet snapshot, keyed by spreadsheet id (cleared on client writes)
+_clients_cache = TTLCache(maxsize=4, ttl=60)
+
+
+# Optimized routes keyed by the delivery set they were solved for (cleared on order writes)
+_optimize_cache = TTLCache(maxsize=256, ttl=900)
+
+
+def _route_cache_key(deliveries: List[dict]) -> str:
+    """Hash of every input that shapes the route: stops, their zones and the fixed points"""
+    stops = sorted(f"{d['id']}:{d['lat']:.5f},{d['lng']:.5f}:{d.get('zona') or ''}" for d in deliveries)
+    fixed = f"{WAREHOUSE_LAT},{WAREHOUSE_LNG}|{HUICHAPAN_LAT},{HUICHAPAN_LNG}"
+    return hashlib.sha1(("|".join(stops) + "|" + fixed).encode()).hexdigest()
+
+
+async def get_clients_cached() -> List[dict]:
+    """Get all clients, re-reading the CLIENTES sheet at most once a minute"""
+    clients = _clients_cache.get(SPREADSHEET_ID)
+    if clients is None:
+        clients = await _run(sheets_client.get_all_clients)
+        _clients_cache[SPREADSHEET_ID] = clients
+    return clients
+
+
+def _solve_sync(delivery_nodes, distance_matrix, time_matrix, depot_location, depot_name, security_waypoint):
+    """Run the OR-Tools solve (CPU-bound); executed in the process pool"""
+    solver = VRPSolver(
+        depot_location=depot_location,
+        depot_name=depot_name,
+        security_waypoint=security_waypoint,
+        security_waypoint_name="Huichapan (Waypoint Seguridad)"
+    )
+    if len(delivery_nodes) > CLUSTER_THRESHOLD:
+        return solver.solve_clustered(delivery_nodes, distance_matrix, time_matrix)
+    return solver.solve(delivery_nodes, distance_matrix, time_matrix)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize connections on startup"""
     global sheets_client, distance_client, places_client, places_client
     
+    # Route optimization runs in separate processes so the event loop stays free
+    app.state.executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+    app.state.jobs = TTLCache(maxsize=256, ttl=3600) # { job_id: asyncio.Task }, for result lookup
+    app.state.running_jobs = set() # strong refs so evicted tasks aren't garbage-collected mid-flight
+    
     # Initialize Google Sheets client
     print(f"DEBUG: SPREADSHEET_ID loaded: '{SPREADSHEET_ID}'")
     
@@ -77,14 +150,18 @@ async def lifespan(app: FastAPI):
     
     # Initialize Distance Matrix client
     if GOOGLE_MAPS_API_KEY:
-        distance_client = DistanceMatrixClient(GOOGLE_MAPS_API_KEY)
-        places_client = PlacesClient(GOOGLE_MAPS_API_KEY) # NEW
+        # One keep-alive pool shared by the Maps clients
+        app.state.http_session = create_pooled_session()
+        distance_client = DistanceMatrixClient(GOOGLE_MAPS_API_KEY, session=app.state.http_session)
+        app.state.matrix_cache = DistanceMatrixCache(distance_client)
+        places_client = PlacesClient(GOOGLE_MAPS_API_KEY, session=app.state.http_session) # NEW
         print("✓ Distance Matrix y Places API configurados")
     
     yield
     
     # Cleanup
     print("Cerrando conexiones...")
+    app.state.executor.shutdown(cancel_futures=True)
 
 
 # Create FastAPI app
@@ -92,6 +169,7 @@ app = FastAPI(
     title="Sistema Última Milla",
     description="API de optimización de rutas para distribuidora de lácteos",
     version="1.0.0",
+    default_response_class=ORJSONResponse,  # orjson: faster for large route/order lists
     lifespan=lifespan
 )
 
@@ -104,35 +182,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress large JSON payloads (optimized routes, order lists) for mobile links
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Serve frontend
 frontend_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), "frontend")
 if os.path.exists(frontend_path):
     app.mount("/static", StaticFiles(directory=frontend_path), name="static")
 
+INDEX_PATH = os.path.join(frontend_path, "index.html")
+SW_PATH = os.path.join(frontend_path, "sw.js")
+MANIFEST_PATH = os.path.join(frontend_path, "manifest.json")
+INDEX_EXISTS = os.path.exists(INDEX_PATH)
+
+# Let browsers / the PWA keep the shell files for a day (FileResponse adds ETag)
+STATIC_CACHE_HEADERS = {"Cache-Control": "public, max-age=86400"}
+
 
 # ============ HEALTH CHECK ============
 
 @app.get("/")
 async def root():
     """Serve the frontend"""
-    index_path = os.path.join(frontend_path, "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path)
+    if INDEX_EXISTS:
+        return FileResponse(INDEX_PATH, headers=STATIC_CACHE_HEADERS)
     return {"message": "Sistema Última Milla API", "status": "running"}
 
 
 @app.get("/sw.js")
 async def service_worker():
     """Serve the service worker from root to allow root scope"""
-    sw_path = os.path.join(frontend_path, "sw.js")
-    return FileResponse(sw_path, media_type="application/javascript")
+    return FileResponse(SW_PATH, media_type="application/javascript", headers=STATIC_CACHE_HEADERS)
 
 
 @app.get("/manifest.json")
 async def manifest():
     """Serve manifest from root"""
-    manifest_path = os.path.join(frontend_path, "manifest.json")
-    return FileResponse(manifest_path, media_type="application/json")
+    return FileResponse(MANIFEST_PATH, media_type="application/json", headers=STATIC_CACHE_HEADERS)
 
 
 @app.get("/api/health")
@@ -168,7 +254,7 @@ async def get_clients():
         }
     
     try:
-        clients = sheets_client.get_all_clients()
+        clients = await _run(sheets_client.get_all_clients)
         return {"clients": clients, "demo_mode": False}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -188,7 +274,7 @@ async def create_client(request: CreateClientRequest):
     
     try:
         # Create Client
-        client_id = sheets_client.create_client({
+        client_id = await _run(sheets_client.create_client, {
             "nombre_negocio": request.nombre_negocio,
             "telefono": request.telefono,
             "latitud": request.latitud,
@@ -199,12 +285,14 @@ async def create_client(request: CreateClientRequest):
         
         # Create special price if provided
         if request.producto and request.precio_pactado:
-            sheets_client.create_special_price(
+            await _run(
+                sheets_client.create_special_price,
                 client_id, 
                 request.producto, 
                 request.precio_pactado
             )
         
+        _clients_cache.clear()
         return {
             "success": True,
             "client_id": client_id,
@@ -220,7 +308,7 @@ async def update_client(client_id: str, request: CreateClientRequest):
         return {"success": True, "message": "Demo Mode: Client Updated"}
         
     try:
-        success = sheets_client.update_client(client_id, {
+        success = await _run(sheets_client.update_client, client_id, {
             "nombre_negocio": request.nombre_negocio,
             "telefono": request.telefono,
             "latitud": request.latitud,
@@ -231,6 +319,7 @@ async def update_client(client_id: str, request: CreateClientRequest):
         if not success:
             raise HTTPException(status_code=404, detail="Cliente no encontrado")
             
+        _clients_cache.clear()
         return {"success": True, "message": "Cliente actualizado"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -245,10 +334,11 @@ async def delete_client(client_id: str):
         return {"success": True, "message": "Demo Mode: Sync Deleted"}
 
     try:
-        success = sheets_client.delete_client(client_id)
+        success = await _run(sheets_client.delete_client, client_id)
         if not success:
             raise HTTPException(status_code=404, detail="Cliente no encontrado")
         
+        _clients_cache.clear()
         return {"success": True, "message": "Cliente eliminado correctamente"}
     except HTTPException:
         raise
@@ -281,9 +371,12 @@ async def get_orders_by_date(fecha_ruta: str, status: Optional[str] = None):
         }
     
     try:
-        orders = sheets_client.get_orders_by_date(fecha_ruta, status)
+        orders, all_clients = await asyncio.gather(
+            _run(sheets_client.get_orders_by_date, fecha_ruta, status),
+            get_clients_cached()
+        )
         # Enrich with client data
-        clients = {c.get("ID_Cliente"): c for c in sheets_client.get_all_clients() if c.get("ID_Cliente")}
+        clients = {c.get("ID_Cliente"): c for c in all_clients if c.get("ID_Cliente")}
         for order in orders:
             client = clients.get(order.get("ID_Cliente"))
             if client:
@@ -312,12 +405,13 @@ async def create_order(request: CreateOrderRequest):
         }
     
     try:
-        order_id = sheets_client.create_order({
+        order_id = await _run(sheets_client.create_order, {
             "id_cliente": request.id_cliente,
             "fecha_ruta": request.fecha_ruta,
             "producto": request.producto,
             "kg_solicitados": request.kg_solicitados
         })
+        _optimize_cache.clear()
         
         return {
             "success": True,
@@ -336,13 +430,14 @@ async def delete_order(order_id: str):
         return {"success": True, "message": "Demo Mode: Order Deleted"}
     
     try:
-        success = sheets_client.delete_order(order_id)
+        success = await _run(sheets_client.delete_order, order_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     if not success:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
-        
+    
+    _optimize_cache.clear()
     return {"success": True, "message": "Pedido eliminado"}
 
 @app.post("/api/orders/{order_id}/complete")
@@ -352,7 +447,7 @@ async def complete_delivery(order_id: str, kg_reales: float, background_tasks: B
         raise HTTPException(status_code=503, detail="Google Sheets no conectado")
     
     try:
-        success = sheets_client.complete_delivery(order_id, kg_reales)
+        success = await _run(sheets_client.complete_delivery, order_id, kg_reales)
         
         if not success:
             raise HTTPException(status_code=404, detail="Pedido no encontrado")
@@ -379,11 +474,16 @@ async def check_market(request: CheckMarketRequest):
     if not places_client:
         return {"market_name": None}
     
-    market_name = places_client.detect_market(request.lat, request.lng)
+    market_name = await _run(places_client.detect_market, request.lat, request.lng)
     return {"market_name": market_name}
 
 
 # ============ PROSPECTING (Lead Gen) ============
+def _name_bucket_key(name: str) -> tuple:
+    """Normalized first two words of a place name, used to bucket chain candidates"""
+    return tuple(re.sub(r"[^\w ]", "", name.lower()).split()[:2])
+
+
 class SearchProspectsRequest(BaseModel):
     lat: Optional[float] = None
     lng: Optional[float] = None
@@ -404,7 +504,7 @@ async def search_prospects(request: SearchProspectsRequest):
     
     # Geocode region if provided
     if request.region_query:
-        location = places_client.geocode_region(request.region_query)
+        location = await _run(places_client.geocode_region, request.region_query)
         if location:
             lat, lng = location['lat'], location['lng']
         else:
@@ -415,31 +515,28 @@ async def search_prospects(request: SearchProspectsRequest):
         
     # Search nearby
     try:
-        raw_results = places_client.search_nearby_places(lat, lng, request.radius)
+        raw_results = await _run(places_client.search_nearby_places, lat, lng, request.radius)
     except Exception as e:
         print(f"Error en search_nearby_places: {e}")
         return {"success": False, "message": f"Error buscando prospectos: {str(e)}"}
     
     # Smart Grouping Logic
     grouped_results = {}
-    singles = []
+    buckets = defaultdict(list) # { name_bucket_key: [group_name, ...] }
     
     for place in raw_results:
         name = place['name']
-        # Simple clustering by name similarity could be complex, 
-        # for now precise name matching or startswith is safer.
-        # Let's use precise name.
-        found_group = False
-        for group_name in grouped_results.keys():
-            # If similarity > 0.8 (difflib)
-            ratio = difflib.SequenceMatcher(None, group_name.lower(), name.lower()).ratio()
-            if ratio > 0.8:
-                grouped_results[group_name].append(place)
-                found_group = True
-                break
+        # Chains share their leading words, so only fuzzy-compare against
+        # groups in the same bucket instead of every group found so far.
+        bucket = buckets[_name_bucket_key(name)]
+        # Best group with similarity >= 80%
+        match = process.extractOne(name, bucket, scorer=fuzz.ratio, processor=str.lower, score_cutoff=80)
         
-        if not found_group:
+        if match:
+            grouped_results[match[0]].append(place)
+        else:
             grouped_results[name] = [place]
+            bucket.append(name)
             
     # Format output
     final_output = []
@@ -483,7 +580,7 @@ async def add_prospect(request: AddProspectRequest):
         return {"success": True, "message": "Modo Demo: Prospecto Guardado"}
         
     try:
-        prospect_id = sheets_client.create_prospect(request.model_dump())
+        prospect_id = await _run(sheets_client.create_prospect, request.model_dump())
         return {
             "success": True, 
             "prospect_id": prospect_id,
@@ -494,6 +591,16 @@ async def add_prospect(request: AddProspectRequest):
 
 # ============ ROUTE OPTIMIZATION ============
 
+def _sheet_coords(records: List[dict]):
+    """(lat, lng) array for sheet records + mask of rows that have both coordinates"""
+    coords = np.fromiter(
+        ((float(r.get("Latitud") or 0), float(r.get("Longitud") or 0)) for r in records),
+        dtype=np.dtype((np.float64, 2)),
+        count=len(records)
+    )
+    return coords, (coords[:, 0] != 0) & (coords[:, 1] != 0)
+
+
 @app.post("/api/optimize-route")
 async def optimize_route(request: OptimizeRouteRequest):
     """
@@ -516,37 +623,38 @@ async def optimize_route(request: OptimizeRouteRequest):
         ]
     else:
         try:
-            # 1. Get confirmed orders
-            orders = sheets_client.get_orders_for_optimization(request.fecha_ruta)
-            
-            # 2. Get active prospects
-            prospects = sheets_client.get_pending_prospects()
+            # 1. Get confirmed orders + 2. Get active prospects (one batchGet, 30s cache)
+            orders, prospects = await _run(sheets_client.batch_get_optimize_inputs, request.fecha_ruta)
             
             deliveries = []
             
             # Process Orders
-            for o in orders:
-                if o.get("Latitud") and o.get("Longitud"):
-                    deliveries.append({
-                        "id": o.get("ID_Pedido"),
-                        "name": o.get("Nombre_Negocio", "Cliente"),
-                        "lat": float(o.get("Latitud", 0)),
-                        "lng": float(o.get("Longitud", 0)),
-                        "type": "order", # Yellow
-                        "zona": o.get("Zona", "")
-                    })
+            coords, valid = _sheet_coords(orders)
+            for i in np.flatnonzero(valid):
+                o = orders[i]
+                lat, lng = coords[i].tolist()
+                deliveries.append({
+                    "id": o.get("ID_Pedido"),
+                    "name": o.get("Nombre_Negocio", "Cliente"),
+                    "lat": lat,
+                    "lng": lng,
+                    "type": "order", # Yellow
+                    "zona": o.get("Zona", "")
+                })
                     
             # Process Prospects
-            for p in prospects:
-                if p.get("Latitud") and p.get("Longitud"):
-                    deliveries.append({
-                        "id": p.get("ID_Prospecto"),
-                        "name": f"[PROSPECTO] {p.get('Nombre_Negocio')}",
-                        "lat": float(p.get("Latitud", 0)),
-                        "lng": float(p.get("Longitud", 0)),
-                        "type": "prospect", # Blue
-                        "zona": "" # Prospects don't have zone yet
-                    })
+            coords, valid = _sheet_coords(prospects)
+            for i in np.flatnonzero(valid):
+                p = prospects[i]
+                lat, lng = coords[i].tolist()
+                deliveries.append({
+                    "id": p.get("ID_Prospecto"),
+                    "name": f"[PROSPECTO] {p.get('Nombre_Negocio')}",
+                    "lat": lat,
+                    "lng": lng,
+                    "type": "prospect", # Blue
+                    "zona": "" # Prospects don't have zone yet
+                })
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Error obteniendo pedidos: {e}")
@@ -559,22 +667,38 @@ async def optimize_route(request: OptimizeRouteRequest):
             total_distance_km=0,
             total_time_minutes=0
         )
+    
+    # Same stops as a recent solve: its visit order is already in the sheet
+    cache_key = _route_cache_key(deliveries)
+    cached_response = _optimize_cache.get(cache_key)
+    if cached_response is not None:
+        return cached_response
 
     # --- GROUPING LOGIC (MARKET ZONES) ---
     all_deliveries_flat = deliveries
-    grouped_deliveries = {} 
+    type_by_id = {d["id"]: d.get("type", "unknown") for d in all_deliveries_flat}
+    grouped_deliveries = {} # { zone_key: [delivery, ...] }
     singles = []
     
     for d in all_deliveries_flat:
-        zona = d.get("zona", "").strip()
-        if zona:
-             zone_key = zona.lower()
-             if zone_key not in grouped_deliveries:
-                 grouped_deliveries[zone_key] = []
-             grouped_deliveries[zone_key].append(d)
+        zone_key = (d.get("zona") or "").strip().lower()
+        if zone_key:
+             grouped_deliveries.setdefault(zone_key, []).append(d)
         else:
              singles.append(d)
     
+    # Centroids of every zone at once: per-zone coordinate sums / member counts
+    group_sizes = [len(items) for items in grouped_deliveries.values()]
+    zone_ids = np.repeat(np.arange(len(group_sizes)), group_sizes)
+    member_coords = np.array(
+        [[d["lat"], d["lng"]] for items in grouped_deliveries.values() for d in items],
+        dtype=np.float64
+    ).reshape(-1, 2)
+    centroids = np.column_stack([
+        np.bincount(zone_ids, weights=member_coords[:, 0], minlength=len(group_sizes)),
+        np.bincount(zone_ids, weights=member_coords[:, 1], minlength=len(group_sizes)),
+    ]) / np.maximum(group_sizes, 1)[:, None]
+    
     # Create Nodes for Solver (Proxy Nodes)
     solver_nodes_map = {} # { 'NODE_ID': [original_delivery_dict] }
     final_nodes_for_solver = []
@@ -585,15 +709,13 @@ async def optimize_route(request: OptimizeRouteRequest):
         final_nodes_for_solver.append(d)
         
     # Add Groups
-    for zone_key, items in grouped_deliveries.items():
+    for (zone_key, items), centroid in zip(grouped_deliveries.items(), centroids):
         if len(items) == 1:
              d = items[0]
              solver_nodes_map[d["id"]] = [d]
              final_nodes_for_solver.append(d)
         else:
-             # Calculate Centroid
-             avg_lat = sum(d["lat"] for d in items) / len(items)
-             avg_lng = sum(d["lng"] for d in items) / len(items)
+             avg_lat, avg_lng = float(centroid[0]), float(centroid[1])
              proxy_name = f"Zona: {items[0].get('zona')}"
              proxy_id = f"GROUP_{zone_key}"
              
@@ -623,36 +745,52 @@ async def optimize_route(request: OptimizeRouteRequest):
         for d in deliveries_for_solver
     ]
     
-    # Build locations list for distance matrix (using Solver Nodes)
-    locations = [
-        (WAREHOUSE_LAT, WAREHOUSE_LNG),  # Depot
-        (HUICHAPAN_LAT, HUICHAPAN_LNG),  # Security waypoint
-    ]
-    locations.extend([(d["lat"], d["lng"]) for d in deliveries_for_solver])
+    # Build locations array for distance matrix (using Solver Nodes)
+    delivery_coords = np.fromiter(
+        ((d["lat"], d["lng"]) for d in deliveries_for_solver),
+        dtype=np.dtype((np.float64, 2)),
+        count=len(deliveries_for_solver)
+    )
+    locations = np.vstack([FIXED_LOCATIONS, delivery_coords])
 
+    # Collapse stops sharing a location (~1 m, 5 decimals) so duplicate legs aren't requested
+    unique_coords = {}
+    idx_map = [
+        unique_coords.setdefault((round(lat, 5), round(lng, 5)), len(unique_coords))
+        for lat, lng in locations.tolist()
+    ]
+    unique_locations = list(unique_coords)
     
-    # Get distance matrix
+    # Get distance matrix (and real travel times when the API answered)
+    compact_durations = None
     if distance_client and not use_demo:
         try:
-            matrix_result = distance_client.get_full_matrix(locations)
-            distance_matrix = matrix_result["distances"]
+            # Legs already fetched by an earlier optimization are reused
+            compact_matrix, compact_durations = await _run(app.state.matrix_cache.get_matrices, unique_locations)
         except Exception as e:
             print(f"Distance Matrix API error, using haversine: {e}")
-            distance_matrix = calculate_haversine_matrix(locations)
+            compact_matrix = calculate_haversine_matrix(unique_locations)
     else:
-        distance_matrix = calculate_haversine_matrix(locations)
-    
-    # Initialize solver
-    solver = VRPSolver(
-        depot_location=(WAREHOUSE_LAT, WAREHOUSE_LNG),
-        depot_name=WAREHOUSE_NAME,
-        security_waypoint=(HUICHAPAN_LAT, HUICHAPAN_LNG),
-        security_waypoint_name="Huichapan (Waypoint Seguridad)"
-    )
+        compact_matrix = calculate_haversine_matrix(unique_locations)
     
+    # Fan back out to one row/column per solver node
+    distance_matrix = np.asarray(compact_matrix, dtype=np.int64)[np.ix_(idx_map, idx_map)].tolist()
+    time_matrix = None
+    if compact_durations is not None:
+        time_matrix = np.asarray(compact_durations, dtype=np.int64)[np.ix_(idx_map, idx_map)].tolist()
     
-    # Solve
-    result = solver.solve(delivery_nodes, distance_matrix)
+    # Solve (off the event loop)
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(
+        app.state.executor,
+        _solve_sync,
+        delivery_nodes,
+        distance_matrix,
+        time_matrix,
+        (WAREHOUSE_LAT, WAREHOUSE_LNG),
+        WAREHOUSE_NAME,
+        (HUICHAPAN_LAT, HUICHAPAN_LNG)
+    )
     
     if not result.success:
         return OptimizeRouteResponse(
@@ -688,21 +826,25 @@ async def optimize_route(request: OptimizeRouteRequest):
     # Replace result with expanded list
     result.ordered_nodes = ordered_nodes_expanded
     
-    # Update Google Sheets with visit order
+    # Update Google Sheets with visit order; only a fully written route is cached
+    sheets_synced = use_demo or not sheets_client
     if sheets_client and not use_demo:
         updates = []
         visit_order = 1
         for node in result.ordered_nodes:
             if not node.is_depot and not node.is_security_waypoint:
-                updates.append({
-                    "order_id": node.id,
-                    "orden_visita": visit_order
-                })
+                # Prospects share the visit sequence but have no PEDIDOS row to update
+                if type_by_id.get(node.id) == "order":
+                    updates.append({
+                        "order_id": node.id,
+                        "orden_visita": visit_order
+                    })
                 visit_order += 1
         
         try:
-            updated_count = sheets_client.batch_update_visit_orders(updates)
+            updated_count = await _run(sheets_client.batch_update_visit_orders, updates)
             print(f"Actualizados {updated_count} pedidos en Google Sheets")
+            sheets_synced = updated_count == len(updates)
         except Exception as e:
             print(f"Error actualizando Sheets: {e}")
     
@@ -717,20 +859,55 @@ async def optimize_route(request: OptimizeRouteRequest):
             "lng": node.lng,
             "is_depot": node.is_depot,
             "is_security_waypoint": node.is_security_waypoint,
-            "type": next((d["type"] for d in all_deliveries_flat if d["id"] == node.id), "unknown") 
+            "type": type_by_id.get(node.id, "unknown")
         }
         if not node.is_depot:
             visit_num += 1
             node_data["visit_order"] = visit_num
         optimized_order.append(node_data)
     
-    return OptimizeRouteResponse(
+    response = OptimizeRouteResponse(
         success=True,
         message=f"Ruta optimizada: {len(deliveries)} entregas + waypoint de seguridad",
         optimized_order=optimized_order,
         total_distance_km=round(result.total_distance_meters / 1000, 2),
         total_time_minutes=round(result.total_time_seconds / 60, 1)
     )
+    if sheets_synced:
+        _optimize_cache[cache_key] = response
+    return response
+
+
+@app.post("/api/optimize-route/jobs", status_code=202)
+async def submit_optimize_route_job(request: OptimizeRouteRequest):
+    """
+    Start a route optimization in the background.
+    Poll GET /api/optimize-route/jobs/{job_id} for the result.
+    """
+    job_id = uuid.uuid4().hex
+    task = asyncio.create_task(optimize_route(request))
+    app.state.running_jobs.add(task)
+    task.add_done_callback(app.state.running_jobs.discard)
+    app.state.jobs[job_id] = task
+    return {"job_id": job_id}
+
+
+@app.get("/api/optimize-route/jobs/{job_id}")
+async def get_optimize_route_job(job_id: str):
+    """Result of a background optimization (202 while it is still running)"""
+    task = app.state.jobs.get(job_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    
+    if not task.done():
+        return JSONResponse(status_code=202, content={"job_id": job_id, "status": "running"})
+    
+    error = task.exception()
+    if isinstance(error, HTTPException):
+        raise error
+    if error:
+        raise HTTPException(status_code=500, detail=str(error))
+    return task.result()
 
 
 # ============ NAVIGATION ============
@@ -760,22 +937,21 @@ async def get_next_delivery(fecha_ruta: str):
         }
     
     try:
-        orders = sheets_client.get_orders_by_date(fecha_ruta, status="En Ruta")
-        
-        if not orders:
-            return {"has_next": False, "delivery": None, "remaining": 0}
+        orders, clients = await asyncio.gather(
+            _run(sheets_client.get_orders_by_date, fecha_ruta, status="En Ruta"),
+            get_clients_cached()
+        )
         
-        # Sort by Orden_Visita and get the first one
+        # Lowest Orden_Visita is next (no need to sort the whole list)
         orders = [o for o in orders if o.get("Orden_Visita")]
-        orders.sort(key=lambda x: int(x.get("Orden_Visita", 999)))
         
         if not orders:
             return {"has_next": False, "delivery": None, "remaining": 0}
         
-        next_delivery = orders[0]
+        next_delivery = min(orders, key=lambda x: int(x.get("Orden_Visita", 999)))
         
         # Enrich with client data
-        client = sheets_client.get_client_by_id(next_delivery.get("ID_Cliente"))
+        client = next((c for c in clients if c.get("ID_Cliente") == next_delivery.get("ID_Cliente")), None)
         if client:
             next_delivery["Nombre_Negocio"] = client.get("Nombre_Negocio")
             next_delivery["Latitud"] = client.get("Latitud")
@@ -813,7 +989,7 @@ async def get_weekly_summary():
         }
     
     try:
-        summary = sheets_client.get_weekly_purchase_summary()
+        summary = await _run(sheets_client.get_weekly_purchase_summary)
         return {"summary": summary, "demo_mode": False}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -831,24 +1007,17 @@ async def get_whatsapp_link(order_id: str):
         }
     
     try:
-        # Get order data
-        worksheet = sheets_client._spreadsheet.worksheet("PEDIDOS")
-        cell = worksheet.find(order_id)
-        if not cell:
+        # Get order and client data (single Sheets request)
+        found = await _run(sheets_client.get_order_with_client, order_id)
+        if not found:
             raise HTTPException(status_code=404, detail="Pedido no encontrado")
         
-        row = worksheet.row_values(cell.row)
+        order, client = found
         order_data = {
-            "ID_Pedido": row[0],
-            "Fecha_Ruta": row[1],
-            "ID_Cliente": row[2],
-            "Producto": row[5],
-            "Kg_Reales": row[7],
-            "Total_Cobrar": row[9]
+            key: order.get(key, "")
+            for key in ("ID_Pedido", "Fecha_Ruta", "ID_Cliente", "Producto", "Kg_Reales", "Total_Cobrar")
         }
         
-        # Get client data
-        client = sheets_client.get_client_by_id(order_data["ID_Cliente"])
         if client:
             order_data["Nombre_Negocio"] = client.get("Nombre_Negocio")
             phone = client.get("Telefono", "")
@@ -858,6 +1027,8 @@ async def get_whatsapp_link(order_id: str):
         link = generate_whatsapp_link(phone, order_data)
         
         return {"link": link, "demo_mode": False}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -876,18 +1047,8 @@ async def get_client_special_prices(client_id: str):
         return {"prices": {}, "demo_mode": True}
     
     try:
-        prices = sheets_client.get_special_prices(client_id)
-        # Simplify list: {"Queso Oaxaca": 140.0, ...}
-        price_map = {}
-        for p in prices:
-            prod = p.get("Producto")
-            try:
-                val = float(p.get("Precio_Pactado", 0))
-                if prod:
-                    price_map[prod] = val
-            except:
-                pass
-                
+        # {"Queso Oaxaca": 140.0, ...}; the generator is only consumed in the worker thread
+        price_map = await _run(dict, sheets_client.iter_special_prices(client_id))
         return {"prices": price_map}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -899,7 +1060,8 @@ async def create_special_price_endpoint(request: CreateSpecialPriceRequest):
         return {"success": True, "message": "Demo Mode: Price Created"}
         
     try:
-        rule_id = sheets_client.create_special_price(
+        rule_id = await _run(
+            sheets_client.create_special_price,
             request.id_cliente,
             request.producto,
             request.precio_pactado
@@ -1,7 +1,7 @@
 """
 Pydantic models for the logistics API
 """
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, List
 from datetime import date, datetime
 from enum import Enum
@@ -32,8 +32,7 @@ class Client(BaseModel):
     telefono_extra: Optional[str] = Field(None, alias="Telefono_Extra")
     ruta_asignada: Optional[str] = Field(None, alias="Ruta_Asignada")
 
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True)
 
 
 class SpecialPrice(BaseModel):
@@ -42,8 +41,7 @@ class SpecialPrice(BaseModel):
     producto: str = Field(..., alias="Producto")
     precio_pactado: float = Field(..., alias="Precio_Pactado")
 
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True)
 
 
 class Order(BaseModel):
@@ -66,8 +64,7 @@ class Order(BaseModel):
     telefono: Optional[str] = None
     direccion: Optional[str] = None
 
-    class Config:
-        populate_by_name = True
+    model_config = ConfigDict(populate_by_name=True)
 
 
 class CreateClientRequest(BaseModel):
@@ -4,8 +4,14 @@ Includes HARD CONSTRAINT for Huichapan security waypoint
 """
 from ortools.constraint_solver import routing_enums_pb2
 from ortools.constraint_solver import pywrapcp
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Tuple, Dict, Any, Optional, Sequence
 from dataclasses import dataclass
+from functools import lru_cache
+import logging
+import math
+import numpy as np
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -67,7 +73,8 @@ class VRPSolver:
         self,
         delivery_nodes: List[DeliveryNode],
         distance_matrix: List[List[int]],
-        time_matrix: Optional[List[List[int]]] = None
+        time_matrix: Optional[List[List[int]]] = None,
+        first_solution_strategy: int = routing_enums_pb2.FirstSolutionStrategy.AUTOMATIC
     ) -> OptimizationResult:
         """
         Solve the VRP with security constraint.
@@ -76,6 +83,7 @@ class VRPSolver:
             delivery_nodes: List of delivery locations (excluding depot and waypoint)
             distance_matrix: Full distance matrix including depot [0] and optionally waypoint [1]
             time_matrix: Optional time matrix (same structure as distance_matrix)
+            first_solution_strategy: OR-Tools FirstSolutionStrategy (AUTOMATIC lets the solver pick)
         
         Returns:
             OptimizationResult with ordered nodes and metrics
@@ -95,16 +103,15 @@ class VRPSolver:
         
         num_nodes = len(all_nodes)
         
-        print(f"DEBUG: VRPSolver.solve - num_nodes: {num_nodes}")
-        print(f"DEBUG: VRPSolver.solve - distance_matrix size: {len(distance_matrix)}x{len(distance_matrix[0]) if distance_matrix else 0}")
-        if len(distance_matrix) > 0:
-            print(f"DEBUG: Matrix Row 0 sample: {distance_matrix[0]}")
-            # Check types
-            print(f"DEBUG: Matrix element type: {type(distance_matrix[0][0])}")
+        # Reject ragged / non-numeric / wrongly sized matrices before they reach OR-Tools' C++ layer
+        distance_matrix = _validated_matrix(distance_matrix, num_nodes, "distance")
+        if distance_matrix is None:
+            return OptimizationResult(False, "Error interno: Matriz de distancias incorrecta", [], 0, 0, [])
         
-        if len(distance_matrix) != num_nodes:
-             print(f"CRITICAL: Matrix size mismatch! Expressed {num_nodes}, got {len(distance_matrix)}")
-             return OptimizationResult(False, "Error interno: Matriz de distancias incorrecta", [], 0, 0, [])
+        if time_matrix is not None:
+            time_matrix = _validated_matrix(time_matrix, num_nodes, "time")
+            if time_matrix is None:
+                return OptimizationResult(False, "Error interno: Matriz de tiempos incorrecta", [], 0, 0, [])
         
         if num_nodes < 2:
             return OptimizationResult(
@@ -116,25 +123,24 @@ class VRPSolver:
                 route_sequence=[]
             )
         
+        # 0-2 deliveries: nothing worth searching, evaluate orderings directly
+        if len(delivery_nodes) <= 2:
+            return self._solve_trivial(all_nodes, distance_matrix, has_waypoint, time_matrix)
+        
         # Create the routing index manager
         manager = pywrapcp.RoutingIndexManager(
             num_nodes,  # Number of locations
             1,          # Number of vehicles
             0           # Depot index
         )
-        print("DEBUG: VRPSolver - RoutingIndexManager created")
+        logger.debug("VRPSolver - RoutingIndexManager created (%d nodes)", num_nodes)
         
         # Create routing model
         routing = pywrapcp.RoutingModel(manager)
-        print("DEBUG: VRPSolver - RoutingModel created")
-        
-        # Create distance callback
-        def distance_callback(from_index, to_index):
-            from_node = manager.IndexToNode(from_index)
-            to_node = manager.IndexToNode(to_index)
-            return distance_matrix[from_node][to_node]
+        logger.debug("VRPSolver - RoutingModel created")
         
-        transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+        # Register the distance matrix directly (evaluated in C++, no Python callback per arc)
+        transit_callback_index = routing.RegisterTransitMatrix(distance_matrix)
         routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
         
         # Add distance dimension
@@ -146,83 +152,300 @@ class VRPSolver:
             'Distance'
         )
         
+        # Travel time dimension, so the reported duration comes from real travel times
+        if time_matrix is not None:
+            time_callback_index = routing.RegisterTransitMatrix(time_matrix)
+            routing.AddDimension(
+                time_callback_index,
+                0,          # No slack (no time windows)
+                3600 * 24,  # Max route duration: one day
+                True,       # Start cumul to zero
+                'Time'
+            )
+        
         # ========================================
         # HARD CONSTRAINT: Huichapan Security
         # ========================================
         if has_waypoint:
             # Force the vehicle to visit index 1 (Huichapan) immediately after depot
             # This is done by making Huichapan the only valid next node from depot
-            # print("DEBUG: VRPSolver - Skipping Hard Constraint (Huichapan) for debugging")
+            # logger.debug("VRPSolver - Skipping Hard Constraint (Huichapan) for debugging")
             
-            # Get the index for the security waypoint
+            # Resolve indices once
+            depot_index = manager.NodeToIndex(0)
             waypoint_index = manager.NodeToIndex(1)
             
             # Lock the arc from depot to waypoint
-            routing.solver().Add(
-                routing.NextVar(manager.NodeToIndex(0)) == waypoint_index
-            )
-        
-        # Set search parameters
-        search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-        search_parameters.first_solution_strategy = (
-            routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-        )
-        # ENABLE METAHEURISTIC FOR BETTER RESULTS
-        search_parameters.local_search_metaheuristic = (
-            routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
-        )
-        search_parameters.time_limit.seconds = 900  # Increased to 15 mins for heavy load
+            routing.solver().Add(routing.NextVar(depot_index) == waypoint_index)
         
         # Solve
-        print("DEBUG: VRPSolver - Starting search...")
-        solution = routing.SolveWithParameters(search_parameters)
-        print("DEBUG: VRPSolver - Search completed")
+        logger.debug("VRPSolver - Starting search...")
+        solution = routing.SolveWithParameters(_search_parameters(first_solution_strategy))
+        logger.debug("VRPSolver - Search completed")
         
         if not solution:
-            return OptimizationResult(
-                success=False,
-                message="No se encontró solución óptima",
-                ordered_nodes=[],
-                total_distance_meters=0,
-                total_time_seconds=0,
-                route_sequence=[]
-            )
+            logger.warning("VRPSolver - No solution found, falling back to sweep")
+            return self._solve_sweep(all_nodes, distance_matrix, has_waypoint, time_matrix)
         
         # Extract solution
-        ordered_nodes = []
-        route_sequence = []
-        index = routing.Start(0)
-        total_distance = 0
-        
-        while not routing.IsEnd(index):
-            node_index = manager.IndexToNode(index)
-            route_sequence.append(node_index)
-            ordered_nodes.append(all_nodes[node_index])
+        route_sequence = _extract_route(routing, manager, solution)
+        ordered_nodes = [all_nodes[i] for i in route_sequence[:-1]]
+        # Matrix is already local; cheaper than one GetArcCostForVehicle call per arc
+        total_distance = sum(
+            distance_matrix[a][b] for a, b in zip(route_sequence, route_sequence[1:])
+        )
+        
+        if time_matrix is not None:
+            time_dimension = routing.GetDimensionOrDie('Time')
+            total_time_seconds = solution.Value(time_dimension.CumulVar(routing.End(0)))
+        else:
+            # Calculate time (assuming ~50 km/h average)
+            total_time_seconds = int(total_distance / 13.89)  # 50 km/h = 13.89 m/s
+        
+        return OptimizationResult(
+            success=True,
+            message=f"Ruta optimizada con {len(ordered_nodes)} paradas",
+            ordered_nodes=ordered_nodes,
+            total_distance_meters=total_distance,
+            total_time_seconds=total_time_seconds,
+            route_sequence=route_sequence
+        )
+
+    
+    def solve_clustered(
+        self,
+        delivery_nodes: List[DeliveryNode],
+        distance_matrix: List[List[int]],
+        time_matrix: Optional[List[List[int]]] = None,
+        max_cluster_size: int = 50
+    ) -> OptimizationResult:
+        """
+        Solve large routes by splitting deliveries into angular sectors around the depot.
+        
+        Each sector is solved independently and the sub-tours are chained in
+        sweep order, so model size grows with the sector size instead of N.
+        Only the first sector goes through the security waypoint.
+        """
+        offset = 2 if self.security_waypoint else 1
+        matrix = np.asarray(distance_matrix, dtype=np.int64)
+        
+        if len(matrix) != offset + len(delivery_nodes):
+            return OptimizationResult(False, "Error interno: Matriz de distancias incorrecta", [], 0, 0, [])
+        
+        times = None
+        if time_matrix is not None:
+            times = np.asarray(time_matrix, dtype=np.int64)
+            if times.shape != matrix.shape:
+                return OptimizationResult(False, "Error interno: Matriz de tiempos incorrecta", [], 0, 0, [])
+        
+        order = _sweep_order(self.depot, delivery_nodes)
+        num_clusters = math.ceil(len(delivery_nodes) / max_cluster_size)
+        sectors = np.array_split(order, num_clusters)
+        
+        plain_solver = VRPSolver(
+            depot_location=(self.depot.lat, self.depot.lng),
+            depot_name=self.depot.name
+        )
+        
+        route_sequence = list(range(offset))
+        ordered_nodes = [self.depot] + ([self.security_waypoint] if self.security_waypoint else [])
+        
+        for i, sector in enumerate(sectors):
+            solver = self if i == 0 else plain_solver
+            head = list(range(offset)) if i == 0 else [0]
+            sub_indices = head + (sector + offset).tolist()
             
-            previous_index = index
-            index = solution.Value(routing.NextVar(index))
-            total_distance += routing.GetArcCostForVehicle(previous_index, index, 0)
+            sub_result = solver.solve(
+                [delivery_nodes[j] for j in sector],
+                matrix[np.ix_(sub_indices, sub_indices)].tolist(),
+                times[np.ix_(sub_indices, sub_indices)].tolist() if times is not None else None
+            )
+            if not sub_result.success:
+                return sub_result
+            
+            # Map sector-local indices back to the full matrix, dropping the depot/waypoint head
+            stops = [sub_indices[k] for k in sub_result.route_sequence[len(head):-1]]
+            
+            # Enter the sector from whichever end is closer to the previous stop
+            if i > 0 and matrix[route_sequence[-1], stops[-1]] < matrix[route_sequence[-1], stops[0]]:
+                stops.reverse()
+            
+            route_sequence.extend(stops)
+            ordered_nodes.extend(delivery_nodes[k - offset] for k in stops)
         
-        # Add final return to depot
         route_sequence.append(0)
+        total_distance = int(matrix[route_sequence[:-1], route_sequence[1:]].sum())
         
-        # Calculate time (assuming ~50 km/h average)
-        total_time_seconds = int(total_distance / 13.89)  # 50 km/h = 13.89 m/s
+        return OptimizationResult(
+            success=True,
+            message=f"Ruta optimizada con {len(ordered_nodes)} paradas ({num_clusters} sectores)",
+            ordered_nodes=ordered_nodes,
+            total_distance_meters=total_distance,
+            total_time_seconds=_route_seconds(route_sequence, total_distance, times),
+            route_sequence=route_sequence
+        )
+    
+    def _solve_sweep(
+        self,
+        all_nodes: List[DeliveryNode],
+        distance_matrix: List[List[int]],
+        has_waypoint: bool,
+        time_matrix: Optional[List[List[int]]] = None
+    ) -> OptimizationResult:
+        """Failsafe tour when OR-Tools finds nothing: angular sweep plus one 2-opt pass"""
+        first = 2 if has_waypoint else 1
+        matrix = np.asarray(distance_matrix, dtype=np.int64)
+        
+        order = _sweep_order(self.depot, all_nodes[first:]) + first
+        sequence = list(range(first)) + order.tolist() + [0]
+        sequence = _two_opt_pass(sequence, matrix, first)
+        
+        total_distance = int(matrix[sequence[:-1], sequence[1:]].sum())
+        total_time_seconds = _route_seconds(sequence, total_distance, time_matrix)
+        
+        ordered_nodes = [all_nodes[i] for i in sequence[:-1]]
         
         return OptimizationResult(
             success=True,
-            message=f"Ruta optimizada con {len(ordered_nodes)} paradas",
+            message=f"Ruta aproximada (fallback) con {len(ordered_nodes)} paradas",
             ordered_nodes=ordered_nodes,
             total_distance_meters=total_distance,
             total_time_seconds=total_time_seconds,
-            route_sequence=route_sequence
+            route_sequence=sequence
         )
+    
+    def _solve_trivial(
+        self,
+        all_nodes: List[DeliveryNode],
+        distance_matrix: List[List[int]],
+        has_waypoint: bool,
+        time_matrix: Optional[List[List[int]]] = None
+    ) -> OptimizationResult:
+        """Pick the cheaper of at most two orderings without building an OR-Tools model"""
+        first = 2 if has_waypoint else 1
+        prefix = list(range(first))
+        deliveries = list(range(first, len(all_nodes)))
+        
+        candidates = [deliveries]
+        if len(deliveries) == 2:
+            candidates.append(deliveries[::-1])
+        
+        best_sequence = None
+        best_distance = None
+        for order in candidates:
+            sequence = prefix + order + [0]
+            distance = sum(distance_matrix[a][b] for a, b in zip(sequence, sequence[1:]))
+            if best_distance is None or distance < best_distance:
+                best_sequence, best_distance = sequence, distance
+        
+        ordered_nodes = [all_nodes[i] for i in best_sequence[:-1]]
+        
+        total_time_seconds = _route_seconds(best_sequence, best_distance, time_matrix)
+        
+        return OptimizationResult(
+            success=True,
+            message=f"Ruta optimizada con {len(ordered_nodes)} paradas",
+            ordered_nodes=ordered_nodes,
+            total_distance_meters=int(best_distance),
+            total_time_seconds=int(total_time_seconds),
+            route_sequence=best_sequence
+        )
+
+
+@lru_cache(maxsize=None)
+def _search_parameters(first_solution_strategy: int):
+    """
+    Search parameters, built once per strategy and reused across solves.
+    
+    The RoutingModel itself can't be shared the same way: once solved it is
+    closed, and later cost evaluators or constraints are silently ignored.
+    """
+    search_parameters = pywrapcp.DefaultRoutingSearchParameters()
+    search_parameters.first_solution_strategy = first_solution_strategy
+    # ENABLE METAHEURISTIC FOR BETTER RESULTS
+    search_parameters.local_search_metaheuristic = (
+        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    )
+    # Bounded search: GLS rarely improves meaningfully past the first seconds
+    search_parameters.time_limit.seconds = 30
+    search_parameters.lns_time_limit.seconds = 2
+    search_parameters.solution_limit = 100
+    search_parameters.use_full_propagation = False
+    return search_parameters
+
+
+def _sweep_order(depot: DeliveryNode, nodes: List[DeliveryNode]) -> np.ndarray:
+    """
+    Indices of nodes sorted by polar angle around the depot, starting after the
+    widest angular gap so a dense group of stops isn't cut in half.
+    """
+    coords = np.array([(n.lat, n.lng) for n in nodes], dtype=np.float64).reshape(-1, 2)
+    angles = np.arctan2(coords[:, 0] - depot.lat, coords[:, 1] - depot.lng)
+    order = np.argsort(angles)
+    if len(order) == 0:
+        return order
+    gaps = np.diff(np.append(angles[order], angles[order[0]] + 2 * np.pi))
+    return np.roll(order, -(int(np.argmax(gaps)) + 1))
+
+
+def _two_opt_pass(sequence: List[int], matrix: np.ndarray, fixed: int) -> List[int]:
+    """
+    One first-improvement 2-opt pass over a closed tour, keeping the first
+    `fixed` positions (depot, waypoint) and the final return in place.
+    Gains are evaluated for all segment ends at once with NumPy.
+    """
+    seq = np.asarray(sequence, dtype=np.int64)
+    n = len(seq)
+    for i in range(max(fixed, 1), n - 2):
+        a, b = seq[i - 1], seq[i]
+        c, d = seq[i + 1:n - 1], seq[i + 2:n]
+        gains = matrix[a, b] + matrix[c, d] - matrix[a, c] - matrix[b, d]
+        j = int(np.argmax(gains))
+        if gains[j] <= 0:
+            continue
+        candidate = seq.copy()
+        candidate[i:i + j + 2] = seq[i:i + j + 2][::-1]
+        # Reversing a segment flips its arcs; only keep the move if the real cost drops
+        if matrix[candidate[:-1], candidate[1:]].sum() < matrix[seq[:-1], seq[1:]].sum():
+            seq = candidate
+    return seq.tolist()
+
+
+def _route_seconds(sequence: List[int], total_distance: int, time_matrix) -> int:
+    """Travel time of a closed tour from time_matrix, or estimated at ~50 km/h without one"""
+    if time_matrix is None:
+        return int(total_distance / 13.89)  # 50 km/h = 13.89 m/s
+    times = np.asarray(time_matrix, dtype=np.int64)
+    return int(times[sequence[:-1], sequence[1:]].sum())
+
+
+def _validated_matrix(matrix: List[List[int]], num_nodes: int, label: str) -> Optional[List[List[int]]]:
+    """Square int matrix of size num_nodes as plain lists, or None if malformed"""
+    try:
+        array = np.asarray(matrix, dtype=np.int64)
+    except (TypeError, ValueError) as e:
+        logger.error("Invalid %s matrix: %s", label, e)
+        return None
+    
+    if array.shape != (num_nodes, num_nodes):
+        logger.error("%s matrix shape mismatch! Expected %s, got %s", label.capitalize(), (num_nodes, num_nodes), array.shape)
+        return None
+    return array.tolist()
+
+
+def _extract_route(routing, manager, solution) -> List[int]:
+    """Node sequence of vehicle 0, from depot back to depot"""
+    indices = [routing.Start(0)]
+    end = routing.End(0)
+    while indices[-1] != end:
+        indices.append(solution.Value(routing.NextVar(indices[-1])))
+    return [manager.IndexToNode(i) for i in indices]
 
 
 def build_distance_matrix_for_solver(
     depot: Tuple[float, float],
     security_waypoint: Optional[Tuple[float, float]],
-    delivery_locations: List[Tuple[float, float]],
+    delivery_locations: Sequence[Tuple[float, float]],
     api_distances: Optional[List[List[int]]] = None
 ) -> List[List[int]]:
     """
@@ -231,14 +454,12 @@ def build_distance_matrix_for_solver(
     Order: [depot, security_waypoint (if exists), ...delivery_locations]
     
     If api_distances is provided, it should already be in this order.
-    Otherwise, uses haversine distances.
+    Otherwise, uses haversine distances, memoized per set of coordinates
+    rounded to ~1 m so repeated optimizations of the same route are free.
     """
     from app.integrations.distance_matrix import calculate_haversine_matrix
     
-    locations = [depot]
-    if security_waypoint:
-        locations.append(security_waypoint)
-    locations.extend(delivery_locations)
+    locations = (depot,) + ((security_waypoint,) if security_waypoint else ()) + tuple(delivery_locations)
     
     if api_distances and len(api_distances) == len(locations):
         return api_distances
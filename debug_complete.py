@@ -1,6 +1,6 @@
 import os
 import sys
-import traceback
+import logging
 from dotenv import load_dotenv
 
 # Add current dir to path
@@ -8,29 +8,32 @@ sys.path.append(os.getcwd())
 
 load_dotenv()
 
+logging.basicConfig(level=logging.DEBUG, format="%(levelname)s: %(message)s")
+logger = logging.getLogger("debug_complete")
+
 from app.integrations.google_sheets import GoogleSheetsClient
 
 GOOGLE_SERVICE_ACCOUNT_FILE = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE", "credentials/service_account.json")
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
 
-print(f"DEBUG: Service Account: {GOOGLE_SERVICE_ACCOUNT_FILE}")
-print(f"DEBUG: Spreadsheet ID: {SPREADSHEET_ID}")
+logger.debug("Service Account: %s", GOOGLE_SERVICE_ACCOUNT_FILE)
+logger.debug("Spreadsheet ID: %s", SPREADSHEET_ID)
 
 if not SPREADSHEET_ID:
-    print("Error: SPREADSHEET_ID not set")
+    logger.error("SPREADSHEET_ID not set")
     sys.exit(1)
 
 try:
-    print(f"Connecting to sheet...")
+    logger.info("Connecting to sheet...")
     client = GoogleSheetsClient(GOOGLE_SERVICE_ACCOUNT_FILE, SPREADSHEET_ID)
     client.connect()
     
     ORDER_ID = "PED-5C49728A" 
     KG_REALES = 1.6
     
-    print(f"Attempting complete_delivery for {ORDER_ID} with {KG_REALES}kg...")
+    logger.info("Attempting complete_delivery for %s with %skg...", ORDER_ID, KG_REALES)
     result = client.complete_delivery(ORDER_ID, KG_REALES)
-    print(f"Result: {result}")
+    logger.info("Result: %s", result)
 
 except Exception:
-    traceback.print_exc()
+    logger.exception("complete_delivery failed")
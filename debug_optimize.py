@@ -1,6 +1,8 @@
 import os
 import sys
 import asyncio
+import logging
+import numpy as np
 from dotenv import load_dotenv
 
 # Add current dir to path
@@ -8,6 +10,9 @@ sys.path.append(os.getcwd())
 
 load_dotenv()
 
+logging.basicConfig(level=logging.DEBUG, format="%(levelname)s: %(message)s")
+logger = logging.getLogger("debug_optimize")
+
 from app.main import optimize_route, OptimizeRouteRequest, sheets_client, distance_client, lifespan
 from app.integrations.google_sheets import GoogleSheetsClient
 from app.integrations.distance_matrix import DistanceMatrixClient
@@ -17,14 +22,14 @@ from fastapi import FastAPI
 app = FastAPI()
 
 async def run_debug():
-    print("--- STARTING DEBUG OPTIMIZATION ---")
+    logger.info("--- STARTING DEBUG OPTIMIZATION ---")
     
     # Manually init clients
     global sheets_client
     GOOGLE_SERVICE_ACCOUNT_FILE = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE", "credentials/service_account.json")
     SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
     
-    print("Connecting to Sheets...")
+    logger.info("Connecting to Sheets...")
     sheets_client = GoogleSheetsClient(GOOGLE_SERVICE_ACCOUNT_FILE, SPREADSHEET_ID)
     sheets_client.connect()
     
@@ -33,9 +38,9 @@ async def run_debug():
     GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
     if GOOGLE_MAPS_API_KEY:
          distance_client = DistanceMatrixClient(GOOGLE_MAPS_API_KEY)
-         print("Distance Client Initialized.")
+         logger.info("Distance Client Initialized.")
     else:
-         print("Using Haversine (No key).")
+         logger.info("Using Haversine (No key).")
 
     # Inject into main module
     import app.main
@@ -54,35 +59,35 @@ async def run_debug():
         origin_lng=-99.3444
     )
     
-    print(f"\n--- INSPECTING SHEET DATA for {target_date} ---")
+    logger.info("--- INSPECTING SHEET DATA for %s ---", target_date)
     ws = sheets_client._spreadsheet.worksheet("PEDIDOS")
-    records = sheets_client._get_all_records_safe(ws)
-    print(f"Total Rows: {len(records)}")
-    if len(records) > 0:
-        # print(f"Sample Row: {records[0]}")
-        print("Dates found in sheet:")
-        dates = set(r.get("Fecha_Ruta") for r in records)
-        print(dates)
+    # One values grid, scanned by column; only matching rows become dicts
+    rows = ws.get_all_values()
+    header, data = (rows[0], np.array(rows[1:], dtype=object)) if rows else ([], np.empty((0, 0), dtype=object))
+    logger.info("Total Rows: %d", len(data))
+    if len(data) > 0:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Sample Row: %s", dict(zip(header, data[0])))
+        fechas = data[:, header.index("Fecha_Ruta")]
+        logger.info("Dates found in sheet: %s", set(fechas))
         
-        print(f"\nRows for {target_date}:")
-        target_rows = [r for r in records if r.get("Fecha_Ruta") == target_date]
+        logger.info("Rows for %s:", target_date)
+        target_rows = [dict(zip(header, row)) for row in data[fechas == target_date]]
         for row in target_rows:
-            print(f" - ID: {row.get('ID_Pedido')}, Status: '{row.get('Estatus')}'")
+            logger.info(" - ID: %s, Status: '%s'", row.get('ID_Pedido'), row.get('Estatus'))
     
-    print(f"\nCalling optimize_route for {req.fecha_ruta}...")
+    logger.info("Calling optimize_route for %s...", req.fecha_ruta)
     try:
-        response = await optimize_route(req)
-        print("\n--- RESPONSE ---")
-        print(f"Success: {response.success}")
-        print(f"Message: {response.message}")
-        print(f"Orders: {len(response.optimized_order)}")
+        response = await asyncio.to_thread(optimize_route, req)
+        logger.info("--- RESPONSE ---")
+        logger.info("Success: %s", response.success)
+        logger.info("Message: %s", response.message)
+        logger.info("Orders: %d", len(response.optimized_order))
         for o in response.optimized_order:
-            print(f" - {o.Orden_Visita}. {o.Nombre_Negocio} ({o.Estatus})")
+            logger.info(" - %s. %s (%s)", o.Orden_Visita, o.Nombre_Negocio, o.Estatus)
             
     except Exception as e:
-        print(f"\nCRITICAL ERROR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("CRITICAL ERROR: %s", e)
 
 if __name__ == "__main__":
     asyncio.run(run_debug())
@@ -1,5 +1,5 @@
 import requests
-import json
+import orjson
 import sys
 
 # Detect today's date
@@ -18,16 +18,16 @@ payload = {
 }
 
 print(f"🔵 Sending POST to {url}")
-print(f"🔵 Payload: {json.dumps(payload, indent=2)}")
+print(f"🔵 Payload: {orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode()}")
 
 try:
     response = requests.post(url, json=payload, timeout=60) # 60s timeout
     print(f"🟢 Response Status: {response.status_code}")
     
     if response.status_code == 200:
-        data = response.json()
+        data = orjson.loads(response.content)
         print("🟢 Optimization Result:")
-        print(json.dumps(data, indent=2))
+        print(orjson.dumps(data, option=orjson.OPT_INDENT_2).decode())
         
         if data.get("success"):
             route = data.get("optimized_route", [])
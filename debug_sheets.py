@@ -1,32 +1,46 @@
 from app.integrations.google_sheets import GoogleSheetsClient
 import os
+import logging
+import numpy as np
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logging.basicConfig(level=logging.DEBUG, format="%(levelname)s: %(message)s")
+logger = logging.getLogger("debug_sheets")
+
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
 CREDENTIALS_FILE = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE", "credentials/service_account.json")
 
-print(f"Connecting to Spreadsheet: {SPREADSHEET_ID}")
+logger.info("Connecting to Spreadsheet: %s", SPREADSHEET_ID)
 try:
     client = GoogleSheetsClient(CREDENTIALS_FILE, SPREADSHEET_ID)
     client.connect()
     
     ws = client._spreadsheet.worksheet("CLIENTES")
-    headers = ws.row_values(1)
-    print(f"HEADERS FOUND ({len(headers)}):")
-    print(headers)
+    # Headers and data in one call for the columnar scan
+    rows = ws.get_all_values()
+    headers = rows[0] if rows else []
+    logger.info("HEADERS FOUND (%d): %s", len(headers), headers)
     
-    # Check for duplicates
+    # Check for duplicates (get_all_records() refuses these)
     if len(headers) != len(set(headers)):
-        print("🚨 ERROR: DUPLICATE HEADERS DETECTED!")
+        logger.error("🚨 DUPLICATE HEADERS DETECTED!")
         seen = set()
         dupes = [x for x in headers if x in seen or seen.add(x)]
-        print(f"Duplicates: {dupes}")
+        logger.error("Duplicates: %s", dupes)
         
-    print("\nTrying get_all_records()...")
+    if len(rows) > 1:
+        data = np.array(rows[1:], dtype=object).reshape(-1, len(headers))
+        non_empty = int((data != "").any(axis=1).sum())
+        logger.info("Fetched %d data rows (%d non-empty).", len(data), non_empty)
+    else:
+        logger.warning("No data rows below the header.")
+    
+    # The call that crashes on bad headers, which this script exists to reproduce
+    logger.info("Trying get_all_records()...")
     records = ws.get_all_records()
-    print(f"Successfully fetched {len(records)} records.")
+    logger.info("Successfully fetched %d records.", len(records))
     
 except Exception as e:
-    print(f"\n❌ FATAL ERROR: {e}")
+    logger.exception("❌ FATAL ERROR: %s", e)
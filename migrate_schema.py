@@ -1,74 +1,152 @@
 from app.integrations.google_sheets import GoogleSheetsClient
+from gspread.utils import rowcol_to_a1
 import os
-from dotenv import load_dotenv
+import asyncio
+from app.config import get_settings
 
-load_dotenv()
+cfg = get_settings()
 
-SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
-CREDENTIALS_FILE = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE", "credentials/service_account.json")
+SPREADSHEET_ID = cfg.spreadsheet_id
+CREDENTIALS_FILE = cfg.google_service_account_file
 
-def migrate():
-    print(f"Starting Migration for Sheet: {SPREADSHEET_ID}")
-    client = GoogleSheetsClient(CREDENTIALS_FILE, SPREADSHEET_ID)
-    client.connect()
-    
-    # 1. CLIENTES MIGRATION
-    ws_clients = client._spreadsheet.worksheet("CLIENTES")
-    headers = ws_clients.row_values(1)
+REQUIRED_CLIENT_COLS = ["Direccion", "Contador_Ventas"]
+
+
+def _add_header_requests(ws, headers, new_labels):
+    """batchUpdate subrequests that grow the sheet if needed and write new_labels after headers"""
+    requests = []
+    missing_cols = len(headers) + len(new_labels) - ws.col_count
+    if missing_cols > 0:
+        requests.append({
+            "appendDimension": {"sheetId": ws.id, "dimension": "COLUMNS", "length": missing_cols}
+        })
+    requests.append({
+        "updateCells": {
+            "rows": [{"values": [{"userEnteredValue": {"stringValue": label}} for label in new_labels]}],
+            "fields": "userEnteredValue",
+            "start": {"sheetId": ws.id, "rowIndex": 0, "columnIndex": len(headers)}
+        }
+    })
+    return requests
+
+
+def _migrate_clientes(ws_clients, headers):
+    """Clean up CLIENTES headers; returns (batchUpdate subrequests, final header row, changed)"""
     print(f"Current Client Headers: {headers}")
     
-    required_client_cols = ["Direccion", "Contador_Ventas"]
+    # One pass: spot duplicates (incl. repeated empty headers, the crash cause)
+    # and count the real, non-empty columns
+    seen = set()
+    dup = False
+    real_width = 0
+    for h in headers:
+        if h in seen:
+            dup = True
+        seen.add(h)
+        if h.strip():
+            real_width += 1
     
-    # Check for empty duplicates first (the crash cause)
-    if len(headers) != len(set(headers)):
+    if dup:
         print("⚠️ Found duplicate/empty headers. Cleaning up...")
         # Trim sheet to actual data width
-        real_width = len([h for h in headers if h.strip()])
         ws_clients.resize(rows=ws_clients.row_count, cols=real_width)
         print(f"Resized CLIENTES to {real_width} columns.")
-        headers = ws_clients.row_values(1) # Refresh
+        headers = headers[:real_width]
         
     # Add missing columns
     new_headers = list(headers)
-    added = False
-    for req in required_client_cols:
-        if req not in new_headers:
-            new_headers.append(req)
-            added = True
-            
-    if added:
+    have = set(new_headers)
+    missing = [c for c in REQUIRED_CLIENT_COLS if c not in have]
+    
+    if missing:
+        new_headers.extend(missing)
         print(f"Adding new headers: {new_headers}")
-        # Resize to fit new columns
-        ws_clients.resize(rows=ws_clients.row_count, cols=len(new_headers))
-        ws_clients.update_cell(1, len(new_headers)-1, "Direccion")
-        ws_clients.update_cell(1, len(new_headers), "Contador_Ventas")
-        print("✅ Added 'Direccion' and 'Contador_Ventas' to CLIENTES.")
-    else:
-        print("✓ CLIENTES schema is up to date.")
+        return _add_header_requests(ws_clients, headers, missing), new_headers, True
+    
+    print("✓ CLIENTES schema is up to date.")
+    return [], new_headers, dup
+
 
-    # 2. PEDIDOS MIGRATION
+def _migrate_pedidos(ws_pedidos, p_headers):
+    """batchUpdate subrequests that add the PEDIDOS columns that are missing"""
     try:
-        ws_pedidos = client._spreadsheet.worksheet("PEDIDOS")
-        p_headers = ws_pedidos.row_values(1)
         print(f"Current Order Headers: {p_headers}")
         
         if "Folio_Nota" not in p_headers:
              print("Adding 'Folio_Nota' to PEDIDOS...")
-             ws_pedidos.resize(rows=ws_pedidos.row_count, cols=len(p_headers)+1)
-             ws_pedidos.update_cell(1, len(p_headers)+1, "Folio_Nota")
-             print("✅ Added 'Folio_Nota' to PEDIDOS.")
+             return _add_header_requests(ws_pedidos, p_headers, ["Folio_Nota"])
         else:
             print("✓ PEDIDOS schema is up to date.")
             
     except Exception as e:
         print(f"Error migrating PEDIDOS: {e}")
+    return []
+
+
+async def migrate():
+    print(f"Starting Migration for Sheet: {SPREADSHEET_ID}")
+    client = GoogleSheetsClient(CREDENTIALS_FILE, SPREADSHEET_ID)
+    await asyncio.to_thread(client.connect)
+    spreadsheet = client._spreadsheet
+    
+    # One metadata fetch builds every worksheet instead of a fetch per .worksheet()
+    worksheets = await asyncio.to_thread(spreadsheet.worksheets)
+    sheets_by_name = {ws.title: ws for ws in worksheets}
+    ws_clients = sheets_by_name["CLIENTES"]
+    ws_pedidos = sheets_by_name.get("PEDIDOS")
+    if ws_pedidos is None:
+        print("⚠️ PEDIDOS sheet not found, skipping its migration.")
+    
+    # Header rows of the sheets that exist, in one values.batchGet
+    ranges = ["CLIENTES!1:1"] + (["PEDIDOS!1:1"] if ws_pedidos else [])
+    header_resp = await asyncio.to_thread(spreadsheet.values_batch_get, ranges)
+    header_rows = [r.get("values", [[]])[0] for r in header_resp["valueRanges"]]
+    headers = header_rows[0]
+    
+    # 1. CLIENTES + 2. PEDIDOS MIGRATION
+    clientes_job = asyncio.to_thread(_migrate_clientes, ws_clients, headers)
+    if ws_pedidos:
+        (client_requests, new_headers, client_changed), pedidos_requests = await asyncio.gather(
+            clientes_job,
+            asyncio.to_thread(_migrate_pedidos, ws_pedidos, header_rows[1]),
+        )
+    else:
+        client_requests, new_headers, client_changed = await clientes_job
+        pedidos_requests = []
+
+    # Header changes for both sheets go out in one batchUpdate
+    requests = client_requests + pedidos_requests
+    if requests:
+        await asyncio.to_thread(spreadsheet.batch_update, {"requests": requests})
+        print("✅ Header changes applied in a single batch update.")
+
+    # Nothing changed: the schema was valid as read, skip the full-sheet validation read
+    if not (client_changed or pedidos_requests or os.getenv("MIGRATE_VALIDATE")):
+        print("\nMigration Complete. No changes needed (set MIGRATE_VALIDATE=1 to validate anyway).")
+        return
 
     print("\nMigration Complete. Attempting validation...")
     try:
-        recs = ws_clients.get_all_records()
+        # Header row and data in one values.batchGet, zipped locally
+        last_col = rowcol_to_a1(1, len(new_headers))[:-1]
+        resp = await asyncio.to_thread(
+            spreadsheet.values_batch_get, ["CLIENTES!1:1", f"CLIENTES!A2:{last_col}"]
+        )
+        header_range, data_range = resp["valueRanges"]
+        final_headers = header_range.get("values", [[]])[0]
+        rows = data_range.get("values", [])
+        
+        # Same checks get_all_records() would trip over
+        if len(final_headers) != len(set(final_headers)):
+            raise ValueError(f"duplicate headers remain: {final_headers}")
+        missing = [c for c in REQUIRED_CLIENT_COLS if c not in final_headers]
+        if missing:
+            raise ValueError(f"missing headers: {missing}")
+        
+        recs = [dict(zip(final_headers, r)) for r in rows]
         print(f"SUCCESS! Read {len(recs)} clients without error.")
     except Exception as e:
         print(f"❌ VALIDATION FAILED: {e}")
 
 if __name__ == "__main__":
-    migrate()
+    asyncio.run(migrate())
@@ -1,27 +1,86 @@
 import os
-import googlemaps
-from dotenv import load_dotenv
+import json
+import time
+import asyncio
+import hashlib
+import tempfile
+import importlib.util
+from pathlib import Path
+import httpx
+from app.config import get_settings
 
-load_dotenv()
+cfg = get_settings()
 
-API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
+API_KEY = cfg.google_maps_api_key
 
-if not API_KEY:
-    print("Error: No API Key")
-    exit(1)
+# Geocode answers for fixed queries barely change; reuse them for 30 days
+CACHE_DIR = Path(".cache/geocode")
+CACHE_MAX_AGE = 30 * 24 * 3600
+
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+# HTTP/2 multiplexing needs the optional h2 package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def load_cached(query):
+    """Cached {"lat", "lng", "addr"} for query, or None if missing/stale"""
+    path = CACHE_DIR / f"{hashlib.sha1(query.encode()).hexdigest()}.json"
+    try:
+        if time.time() - path.stat().st_mtime > CACHE_MAX_AGE:
+            return None
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cached(query, entry):
+    """Write the geocode result atomically so a crash never leaves a half file"""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = CACHE_DIR / f"{hashlib.sha1(query.encode()).hexdigest()}.json"
+    with tempfile.NamedTemporaryFile("w", dir=CACHE_DIR, delete=False) as f:
+        json.dump(entry, f)
+    os.replace(f.name, path)
+
+
+async def geocode_all(queries):
+    """Geocode several queries over one pooled connection, at most 10 in flight"""
+    async with httpx.AsyncClient(http2=HTTP2_AVAILABLE, timeout=5.0) as client:
+        sem = asyncio.Semaphore(10)
+        
+        async def one(q):
+            async with sem:
+                r = await client.get(GEOCODE_URL, params={"address": q, "key": API_KEY})
+                r.raise_for_status()
+                data = r.json()
+                # The API reports quota/key problems in the body with a 200
+                if data.get("status") not in ("OK", "ZERO_RESULTS"):
+                    raise RuntimeError(data.get("error_message") or data.get("status"))
+                return data.get("results", [])
+        
+        return await asyncio.gather(*(one(q) for q in queries))
 
-gmaps = googlemaps.Client(key=API_KEY)
 
 # Geocode the Plus Code
 query = "98FQ+P3 Huichapan, Hidalgo"
 print(f"Geocoding: {query}")
 
 try:
-    results = gmaps.geocode(query)
-    if results:
-        loc = results[0]['geometry']['location']
-        print(f"FOUND: lat={loc['lat']}, lng={loc['lng']}")
-        print(f"Address: {results[0]['formatted_address']}")
+    entry = load_cached(query)
+    if entry is None:
+        if not API_KEY:
+            print("Error: No API Key")
+            exit(1)
+        
+        (results,) = asyncio.run(geocode_all([query]))
+        if results:
+            loc = results[0]['geometry']['location']
+            entry = {"lat": loc['lat'], "lng": loc['lng'], "addr": results[0]['formatted_address']}
+            save_cached(query, entry)
+    
+    if entry:
+        print(f"FOUND: lat={entry['lat']}, lng={entry['lng']}")
+        print(f"Address: {entry['addr']}")
     else:
         print("No results found.")
 except Exception as e:
@@ -23,8 +23,8 @@ async def get_client_special_prices(client_id: str):
                 val = float(p.get("Precio_Pactado", 0))
                 if prod:
                     price_map[prod] = val
-            except:
-                pass
+            except (TypeError, ValueError):
+                continue
                 
         return {"prices": price_map}
     except Exception as e:
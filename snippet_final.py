@@ -1,7 +1,24 @@
 
 # ============ SPECIAL PRICES INJECTION ============
+import asyncio
+from cachetools import TTLCache
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
 
+# Sheets calls run in worker threads; cap how many are in flight at once
+_sheets_semaphore = asyncio.Semaphore(10)
+
+
+async def _sheets_call(fn, *args):
+    """Run a blocking GoogleSheetsClient method off the event loop"""
+    async with _sheets_semaphore:
+        return await asyncio.to_thread(fn, *args)
+
+
+# Parsed price maps per client, dropped when a new rule is written for that client
+_price_cache = TTLCache(maxsize=1024, ttl=60)
+
+
 class CreateSpecialPriceRequest(BaseModel):
     id_cliente: str
     producto: str
@@ -13,20 +30,16 @@ async def get_client_special_prices(client_id: str):
     if not sheets_client:
         return {"prices": {}, "demo_mode": True}
     
+    cached = _price_cache.get(client_id)
+    if cached is not None:
+        return ORJSONResponse({"prices": cached})
+    
     try:
-        prices = sheets_client.get_special_prices(client_id)
-        # Simplify list: {"Queso Oaxaca": 140.0, ...}
-        price_map = {}
-        for p in prices:
-            prod = p.get("Producto")
-            try:
-                val = float(p.get("Precio_Pactado", 0))
-                if prod:
-                    price_map[prod] = val
-            except:
-                pass
-                
-        return {"prices": price_map}
+        # {"Queso Oaxaca": 140.0, ...} built straight from the (producto, precio) stream;
+        # the generator is only consumed inside the worker thread
+        price_map = await _sheets_call(dict, sheets_client.iter_special_prices(client_id))
+        _price_cache[client_id] = price_map
+        return ORJSONResponse({"prices": price_map})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -37,11 +50,13 @@ async def create_special_price_endpoint(request: CreateSpecialPriceRequest):
         return {"success": True, "message": "Demo Mode: Price Created"}
         
     try:
-        rule_id = sheets_client.create_special_price(
+        rule_id = await _sheets_call(
+            sheets_client.create_special_price,
             request.id_cliente,
             request.producto,
             request.precio_pactado
         )
+        _price_cache.pop(request.id_cliente, None)
         return {
             "success": True,
             "rule_id": rule_id,
@@ -1,6 +1,5 @@
 import sys
-import os
-from dotenv import load_dotenv
+from app.config import get_settings
 from app.integrations.google_sheets import GoogleSheetsClient
 
 # Usage: python3 update_url.py "https://new-url.trycloudflare.com"
@@ -11,9 +10,9 @@ if len(sys.argv) < 2:
 
 new_url = sys.argv[1]
 
-load_dotenv()
-SPREADSHEET_ID = os.getenv('SPREADSHEET_ID')
-GOOGLE_SERVICE_ACCOUNT_FILE = os.getenv('GOOGLE_SERVICE_ACCOUNT_FILE', 'credentials/service_account.json')
+cfg = get_settings()
+SPREADSHEET_ID = cfg.spreadsheet_id
+GOOGLE_SERVICE_ACCOUNT_FILE = cfg.google_service_account_file
 
 if not SPREADSHEET_ID:
     print("Error: SPREADSHEET_ID not set.")
@@ -23,21 +22,19 @@ try:
     client = GoogleSheetsClient(GOOGLE_SERVICE_ACCOUNT_FILE, SPREADSHEET_ID)
     client.connect()
     
-    # Update SYSTEM_CONFIG sheet
-    # We assume it exists (created by previous step or manual)
-    # If not, let's create it on the fly to be safe
-    try:
-        ws = client._spreadsheet.worksheet('SYSTEM_CONFIG')
-    except:
-        ws = client._spreadsheet.add_worksheet(title='SYSTEM_CONFIG', rows=10, cols=2)
-        ws.update('A1', 'CURRENT_API_URL')
-
-    # Ensure A1 has the key (Fix for empty A1 causing APK parse failure)
-    ws.update_acell('A1', 'CURRENT_API_URL')
-
-    # Update Cell B1 with the new URL
-    # Use update_acell for single cell update to avoid argument mismatch errors
-    ws.update_acell('B1', new_url)
+    # Update SYSTEM_CONFIG sheet, creating it on the fly if it doesn't exist.
+    # One metadata read tells us which; no failed lookup round trip.
+    meta = client._spreadsheet.fetch_sheet_metadata()
+    sheet_names = {s['properties']['title'] for s in meta['sheets']}
+    if 'SYSTEM_CONFIG' not in sheet_names:
+        client._spreadsheet.add_worksheet(title='SYSTEM_CONFIG', rows=10, cols=2)
+
+    # Write key (A1) and URL (B1) together so the APK never reads a half-updated row
+    # (an empty A1 used to cause APK parse failures)
+    client._spreadsheet.values_batch_update({
+        "valueInputOption": "RAW",
+        "data": [{"range": "SYSTEM_CONFIG!A1:B1", "values": [["CURRENT_API_URL", new_url]]}]
+    })
     print(f"SUCCESS: Updated Google Sheet with new URL: {new_url}")
 
 except Exception as e: